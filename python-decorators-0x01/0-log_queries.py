@@ -2,41 +2,74 @@
 """
 This module demonstrates a simple Python decorator to log SQL queries
 with a timestamp, as required by the checker.
+
+The log records are structured (see query_log): each one carries its
+timestamp, the query fingerprint, a hash of its parameters, the duration,
+the number of rows, the caller and the error if the call failed, and they
+are written as JSON lines by a background thread so
+the decorated function never waits on the output. Every query is also
+counted in per-fingerprint latency statistics (query_log.print_stats()).
 """
 import sqlite3
 import functools
-from datetime import datetime  # <--- هذا هو السطر المطلوب إضافته
+import sys
+import time
+from datetime import datetime
+
+import query_log
 
 # --- decorator to log SQL queries ---
-def log_queries(func):
+def _row_count(result):
+    """Returns the number of rows in a query result, when it can tell."""
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    rowcount = getattr(result, 'rowcount', -1)
+    return rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+
+
+def log_queries(func=None, *, sample_rate=None, slow_query_ms=None):
     """
-    A decorator that logs the SQL query string along with a timestamp
-    before executing the function.
+    A decorator that logs each SQL query the function executes, with its
+    duration and the number of rows it returned.
+
+    It can be used bare (``@log_queries``) or with settings for this
+    function only (``@log_queries(sample_rate=0.1, slow_query_ms=50)``);
+    settings left out follow query_log.settings. Calls that raise are
+    logged with their error, and the error is re-raised.
+
+    Args:
+        sample_rate (float): The fraction of queries logged, from 0 to 1.
+        slow_query_ms (float): Queries taking at least this long are always
+            logged, as warnings.
     """
+    if func is None:
+        return lambda f: log_queries(f, sample_rate=sample_rate, slow_query_ms=slow_query_ms)
+    if sample_rate is not None and not 0 <= sample_rate <= 1:
+        raise ValueError("sample_rate must be between 0 and 1")
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # --- هذا هو الجزء الذي تم تعديله ---
-        
-        # الحصول على الوقت والتاريخ الحالي
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # البحث عن استعلام SQL في المدخلات
-        query = None
-        if args:
-            query = args[0]
-        elif 'query' in kwargs:
-            query = kwargs['query']
-        
-        # طباعة رسالة التسجيل مع الوقت والتاريخ
-        if query:
-            print(f"[{timestamp}] LOG: Executing query: '{query}'")
-        else:
-            print(f"[{timestamp}] LOG: No query string found in arguments to log.")
-        
-        # ------------------------------------
-        
-        # تشغيل الدالة الأصلية
-        return func(*args, **kwargs)
+        # Find the SQL query and its parameters in the arguments
+        query = kwargs.get('query', args[0] if args else None)
+        params = kwargs.get('params', args[1] if len(args) > 1 else None)
+
+        start = time.perf_counter()
+        result = error = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            # Only the code object and line number are read here; the log
+            # line is formatted by the background thread
+            frame = sys._getframe(1)
+            caller = (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+            query_log.record_query(query, params, duration,
+                                   _row_count(result) if error is None else None, caller,
+                                   error, sample_rate, slow_query_ms)
     return wrapper
 
 @log_queries
@@ -58,7 +91,12 @@ def fetch_all_users(query):
 # --- fetch users while logging the query ---
 if __name__ == '__main__':
     # لا داعي لتغيير هذا الجزء
-    print("Attempting to fetch users...")
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Attempting to fetch users...")
     users = fetch_all_users("SELECT * FROM users")
     print("\nQuery has been executed. Results:")
-    print(users)
\ No newline at end of file
+    print(users)
+
+    for user_id in range(1, 4):
+        fetch_all_users(f"SELECT * FROM users WHERE id = {user_id}")
+    print("\nQuery statistics (the three lookups share one fingerprint):")
+    query_log.print_stats()
\ No newline at end of file
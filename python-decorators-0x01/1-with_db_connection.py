@@ -6,6 +6,8 @@ database connections, reducing boilerplate code.
 import sqlite3
 import functools
 
+from db_pool import get_pool, with_pooled_connection
+
 def with_db_connection(func):
     """
     A decorator that handles the database connection lifecycle.
@@ -48,6 +50,16 @@ def get_user_by_id(conn, user_id):
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
+@with_pooled_connection
+def get_user_by_id_pooled(conn, user_id):
+    """
+    The same lookup with a pooled connection: the connection is opened once
+    and reused by later calls instead of being reopened every time.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
+
 # --- Fetch user by ID with automatic connection handling ---
 if __name__ == '__main__':
     # Make sure you have run setup_db.py first
@@ -57,4 +69,11 @@ if __name__ == '__main__':
 
     print("\nFetching user with ID 99 (should not exist)...")
     user_not_found = get_user_by_id(user_id=99)
-    print(user_not_found)
\ No newline at end of file
+    print(user_not_found)
+
+    print("\nFetching users 1 and 2 a thousand times each with a pooled connection...")
+    for _ in range(1000):
+        get_user_by_id_pooled(user_id=1)
+        get_user_by_id_pooled(user_id=2)
+    print(get_user_by_id_pooled(user_id=1))
+    print(f"Pool stats: {get_pool().stats()}")
\ No newline at end of file
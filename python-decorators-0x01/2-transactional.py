@@ -6,6 +6,8 @@ management, ensuring data integrity during database operations.
 import sqlite3
 import functools
 
+from result_cache import TableTracker, invalidate_tables
+
 # --- Decorator from previous task (required) ---
 def with_db_connection(func):
     """
@@ -32,6 +34,9 @@ def transactional(func):
     A decorator that wraps a function in a database transaction.
     It commits the transaction if the function executes successfully,
     and rolls back if any exception occurs.
+
+    The tables written during the transaction are recorded, and once it
+    commits, the cached query results that read them are invalidated.
     """
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
@@ -40,11 +45,17 @@ def transactional(func):
             # data-modifying statement (like INSERT, UPDATE, DELETE).
             print(f"LOG: Starting transaction for function '{func.__name__}'...")
             
-            result = func(conn, *args, **kwargs)
+            with TableTracker(conn) as tracked:
+                result = func(conn, *args, **kwargs)
+            written = tracked.writes
             
             # If the function completes without errors, commit the changes.
             conn.commit()
             print("LOG: Transaction committed successfully.")
+            if written:
+                # Cached results that read these tables are now stale
+                invalidate_tables(written)
+                print(f"LOG: Invalidated cached queries on: {', '.join(sorted(written))}")
             return result
         except Exception as e:
             # If any error occurs, roll back all changes made during the transaction.
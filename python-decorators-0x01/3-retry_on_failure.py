@@ -2,11 +2,20 @@
 """
 This module demonstrates a decorator that can retry a function
 if it fails, making the application more resilient to transient errors.
+
+Only errors that retry_policy.is_retryable() classifies as transient are
+retried, after an exponential delay with full jitter, and only while the
+shared retry budget allows it. Coroutine functions are supported too: they
+wait with asyncio.sleep() instead of blocking the event loop.
 """
+import asyncio
+import inspect
 import time
 import sqlite3
 import functools
 
+from retry_policy import backoff_delay, default_budget, is_retryable
+
 # --- Decorator from a previous task (required) ---
 def with_db_connection(func):
     """Decorator to handle the database connection lifecycle."""
@@ -26,34 +35,71 @@ def with_db_connection(func):
     return wrapper
 
 # --- New decorator for this task ---
-def retry_on_failure(retries=3, delay=1):
+def retry_on_failure(retries=3, delay=1, max_delay=30, retryable=is_retryable,
+                     budget=default_budget):
     """
     A decorator factory that makes a function retry its execution
     upon failure.
 
     Args:
         retries (int): The maximum number of attempts.
-        delay (int): The number of seconds to wait between retries.
+        delay (float): The base delay in seconds. The wait before retry n is
+            random, between 0 and delay * 2 ** (n - 1).
+        max_delay (float): The upper limit of the wait between attempts.
+        retryable: Called with the error; the call is retried only if it
+            returns True (default: retry_policy.is_retryable).
+        budget (RetryBudget): The retry budget shared with other callers,
+            or None for no limit.
     """
+    def should_retry(attempt, error):
+        """Logs a failed attempt and decides whether to try again."""
+        print(f"LOG: Attempt {attempt} of {retries} failed: {error}")
+        if not retryable(error):
+            print("LOG: The error is not retryable. Raising exception.")
+            return False
+        # If this was the last attempt, re-raise the exception
+        if attempt == retries:
+            print("LOG: All retries failed. Raising exception.")
+            return False
+        if budget is not None and not budget.try_spend():
+            print("LOG: Retry budget exhausted. Raising exception.")
+            return False
+        return True
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if budget is not None:
+                    budget.record_call()
+                for attempt in range(1, retries + 1):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        if not should_retry(attempt, e):
+                            raise
+                        wait = backoff_delay(attempt, delay, max_delay)
+                        print(f"LOG: Retrying in {wait:.2f} second(s)...")
+                        # Other tasks keep running while this one waits
+                        await asyncio.sleep(wait)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for i in range(retries):
+            if budget is not None:
+                budget.record_call()
+            for attempt in range(1, retries + 1):
                 try:
                     # Attempt to execute the decorated function
                     return func(*args, **kwargs)
                 except Exception as e:
-                    # If it fails, log the attempt and error
-                    print(f"LOG: Attempt {i + 1} of {retries} failed: {e}")
-                    
-                    # If this was the last attempt, re-raise the exception
-                    if i == retries - 1:
-                        print("LOG: All retries failed. Raising exception.")
+                    if not should_retry(attempt, e):
                         raise
-                    
-                    # Wait for the specified delay before the next attempt
-                    print(f"LOG: Retrying in {delay} second(s)...")
-                    time.sleep(delay)
+                    # Wait a random, growing delay so callers that failed
+                    # together do not retry together
+                    wait = backoff_delay(attempt, delay, max_delay)
+                    print(f"LOG: Retrying in {wait:.2f} second(s)...")
+                    time.sleep(wait)
         return wrapper
     return decorator
 
@@ -75,8 +121,8 @@ def fetch_users_with_retry(conn):
     
     # Simulate a transient error for the first 2 attempts
     if ATTEMPT_COUNTER < 3:
-        print("Simulating a database connection error...")
-        raise sqlite3.OperationalError("Mock Error: database is temporarily unavailable")
+        print("Simulating a locked database...")
+        raise sqlite3.OperationalError("database is locked")
     
     # On the 3rd attempt, it will succeed
     print("Connection successful!")
@@ -2,13 +2,22 @@
 """
 This module demonstrates a decorator for caching database query results
 to improve performance by avoiding redundant database calls.
+
+The results live in a result_cache.QueryCache: a size-bounded LRU cache
+whose entries expire after a TTL and are dropped when the transactional
+decorator commits a write to a table they read. Concurrent misses for the
+same query share one execution, and with stale_ttl an expired result keeps
+being served while a single background refresh runs.
 """
 import time
 import sqlite3
 import functools
+import threading
+
+from result_cache import QueryCache, TableTracker, database_name, default_cache
 
-# A simple in-memory cache implemented as a dictionary
-query_cache = {}
+# The cache shared by every decorated function
+query_cache = default_cache
 
 # --- Decorator from a previous task (required) ---
 def with_db_connection(func):
@@ -29,38 +38,93 @@ def with_db_connection(func):
     return wrapper
 
 # --- New decorator for this task ---
-def cache_query(func):
+def _query_arguments(args, kwargs):
+    """Finds the connection, SQL and bound parameters of a decorated call."""
+    conn = kwargs.get('conn', args[0] if args else None)
+    query = kwargs.get('query')
+    if query is None and len(args) > 1:
+        # Assumes the query is the second argument after 'conn'
+        query = args[1]
+    params = kwargs.get('params')
+    if params is None and len(args) > 2:
+        params = args[2]
+    return conn, query, params or ()
+
+
+def _with_connection(args, kwargs, conn):
+    """Returns the call's arguments with its connection replaced by conn."""
+    if 'conn' in kwargs:
+        return args, dict(kwargs, conn=conn)
+    return (conn,) + tuple(args[1:]), kwargs
+
+
+def _run_tracked(func, args, kwargs, conn):
+    """Runs the query function; returns its result and the tables it read."""
+    with TableTracker(conn) as tracked:
+        result = func(*args, **kwargs)
+    return result, tracked.reads
+
+
+def cache_query(func=None, *, ttl=None, stale_ttl=0.0, cache=None, connect=sqlite3.connect):
     """
-    A decorator that caches the results of a function based on its arguments.
-    It uses the SQL query string as the key for the cache.
+    A decorator that caches the results of a query function.
+
+    The cache key is the database the connection points at, the SQL string
+    and its bound parameters, so the same query against another database or
+    with other parameters is cached separately. The tables the query reads
+    are recorded as it runs, so a committed write to any of them drops the
+    entry. It can be used bare
+    (``@cache_query``) or with options (``@cache_query(ttl=30)``).
+
+    If several threads miss the same key at once, the query runs only once
+    and they all receive its result.
+
+    Args:
+        ttl (float): Seconds a result stays fresh (default: the cache's
+            default_ttl).
+        stale_ttl (float): Seconds an expired result is still returned
+            while it is refreshed in the background.
+        cache (QueryCache): The cache to use (default: query_cache).
+        connect: Opens a connection to a database by name, for background
+            refreshes (the caller's connection is closed by then).
     """
+    if func is None:
+        return lambda f: cache_query(f, ttl=ttl, stale_ttl=stale_ttl, cache=cache,
+                                     connect=connect)
+    store = cache if cache is not None else query_cache
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Create a unique key for the cache. A simple way is to use the
-        # string representation of all arguments. For this task, we focus
-        # on the 'query' argument.
-        
-        # Find the query string from either positional or keyword arguments
-        query = kwargs.get('query')
-        if not query and args:
-            # Assumes the query is the second argument after 'conn'
-            if len(args) > 1:
-                query = args[1]
-
-        # Use the query string as the cache key
-        cache_key = query
-
-        # Check if the result is already in the cache
-        if cache_key in query_cache:
-            print(f"LOG: Returning result from cache for key: '{cache_key}'")
-            return query_cache[cache_key]
-
-        # If not in cache, execute the function
-        print(f"LOG: Query not in cache. Executing and caching result for key: '{cache_key}'")
-        result = func(*args, **kwargs)
-        
-        # Store the result in the cache
-        query_cache[cache_key] = result
+        conn, query, params = _query_arguments(args, kwargs)
+        try:
+            database = database_name(conn)
+            cache_key = QueryCache.make_key(database, query, params)
+            hash(cache_key)
+        except (AttributeError, TypeError, sqlite3.Error):
+            # No usable connection or unhashable parameters: don't cache
+            return func(*args, **kwargs)
+
+        executed = []
+
+        def load():
+            # Only runs on a miss, and only in one of the threads missing at once
+            print(f"LOG: Query not in cache. Executing and caching result for key: '{query}' {params}")
+            executed.append(True)
+            return _run_tracked(func, args, kwargs, conn)
+
+        def refresh():
+            print(f"LOG: Refreshing stale result in the background for key: '{query}' {params}")
+            fresh_conn = connect(database)
+            try:
+                fresh_args, fresh_kwargs = _with_connection(args, kwargs, fresh_conn)
+                return _run_tracked(func, fresh_args, fresh_kwargs, fresh_conn)
+            finally:
+                fresh_conn.close()
+
+        result = store.get_or_load(cache_key, load, ttl=ttl, stale_ttl=stale_ttl,
+                                   refresher=refresh)
+        if not executed:
+            print(f"LOG: Returning result from cache for key: '{query}' {params}")
         return result
     return wrapper
 
@@ -101,4 +165,16 @@ if __name__ == '__main__':
     # Verify that the results are the same
     assert users_1 == users_2
     print("Assertion passed: Results from both calls are identical.")
-    print(f"\nCurrent cache state: {query_cache}")
\ No newline at end of file
+
+    print("\n--- Five concurrent calls for a new query (it should execute once) ---")
+    start_time_3 = time.time()
+    threads = [threading.Thread(target=fetch_users_with_cache,
+                                kwargs={'query': "SELECT * FROM users ORDER BY id"})
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Time taken for five concurrent calls: {time.time() - start_time_3:.2f} seconds")
+    print(f"\nCurrent cache state: {query_cache}")
+    print(f"Cache stats: {query_cache.stats()}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+"""
+This module provides a circuit breaker for database calls.
+
+When the database is down, retrying every call only makes each caller wait
+``retries * delay`` seconds before failing, and threads pile up. A circuit
+breaker watches the failure rate instead and, once it is too high, fails
+calls immediately until the database has had time to recover:
+
+- closed: calls go through; their outcomes are recorded over a rolling
+  window of ``window`` seconds. If at least ``min_calls`` were made and the
+  failure rate reaches ``failure_rate``, the breaker opens.
+- open: calls fail at once with CircuitOpenError, without touching the
+  database, for ``reset_timeout`` seconds.
+- half-open: up to ``probes`` calls are let through as probes. If they all
+  succeed the breaker closes; if one fails it opens again.
+
+Only errors that say something about the database's health count as
+failures (by default the transient ones of retry_policy.is_retryable); a
+constraint violation does not open the breaker.
+
+The breaker goes outside retry_on_failure, so one retried call counts
+once, and outside with_db_connection, so an open breaker does not even
+open a connection:
+
+    @circuit_breaker(users_db)
+    @with_db_connection
+    @retry_on_failure(retries=3, delay=1)
+    def fetch_users(conn):
+        ...
+"""
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+
+from retry_policy import is_retryable
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the function while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the failure rate of calls and decides which ones may run.
+
+    Args:
+        name (str): A name for the log messages.
+        failure_rate (float): The fraction of failed calls, from 0 to 1,
+            that opens the breaker.
+        window (float): The length in seconds of the rolling window the
+            failure rate is measured over.
+        min_calls (int): The breaker stays closed until the window holds at
+            least this many calls.
+        reset_timeout (float): Seconds the breaker stays open before
+            letting probes through.
+        probes (int): The number of successful probe calls needed to close
+            it again.
+        is_failure: Called with an error; returns True if it counts as a
+            failure (default: retry_policy.is_retryable).
+    """
+    def __init__(self, name='database', failure_rate=0.5, window=30.0, min_calls=10,
+                 reset_timeout=30.0, probes=1, is_failure=is_retryable):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.is_failure = is_failure
+        self._state = CLOSED
+        self._outcomes = deque()  # (time, failed) of the calls in the window
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_running = 0
+        self._probe_successes = 0
+        self._cycle = 0  # Counts the half-open periods, to tag their probes
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        """The current state: "closed", "open" or "half-open"."""
+        with self._lock:
+            self._check_timeout()
+            return self._state
+
+    def _check_timeout(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._cycle += 1
+            self._probes_running = 0
+            self._probe_successes = 0
+            print(f"LOG: Circuit '{self.name}' is half-open; letting probe calls through.")
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+        self.times_opened += 1
+        print(f"LOG: Circuit '{self.name}' opened; failing calls fast for "
+              f"{self.reset_timeout} seconds.")
+
+    def before_call(self):
+        """
+        Admits a call or rejects it.
+
+        Returns:
+            int: For a half-open probe, the number of the half-open period
+            that admitted it (never 0); otherwise 0. Pass it back to
+            record() or abandon().
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with all
+                its probes already running.
+        """
+        with self._lock:
+            self._check_timeout()
+            if self._state == CLOSED:
+                return 0
+            if self._state == HALF_OPEN and self._probes_running < self.probes - self._probe_successes:
+                self._probes_running += 1
+                return self._cycle
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open; not calling the database")
+
+    def _current_probe(self, probe):
+        """True if probe was admitted by the half-open period still running."""
+        return self._state == HALF_OPEN and probe == self._cycle
+
+    def record(self, probe, error=None):
+        """
+        Records the outcome of an admitted call.
+
+        A probe that finishes after its half-open period ended (the breaker
+        reopened, and perhaps half-opened again) is ignored: its slot was
+        already reset, and its outcome belongs to the earlier period.
+        """
+        failed = error is not None and self.is_failure(error)
+        with self._lock:
+            if probe:
+                if not self._current_probe(probe):
+                    return
+                self._probes_running -= 1
+                if failed:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probes:
+                    self._state = CLOSED
+                    print(f"LOG: Circuit '{self.name}' closed; the database is back.")
+                return
+            if self._state != CLOSED:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and self._outcomes[0][0] <= now - self.window:
+                self._failures -= self._outcomes.popleft()[1]
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                self._open()
+
+    def abandon(self, probe):
+        """
+        Releases an admitted call that ended without an outcome.
+
+        A call interrupted by cancellation or KeyboardInterrupt says nothing
+        about the database, but a probe must still give its slot back or
+        the breaker would stay half-open for good.
+        """
+        if probe:
+            with self._lock:
+                # The breaker may have reopened and reset its probes meanwhile
+                if self._current_probe(probe):
+                    self._probes_running -= 1
+
+    def stats(self):
+        """Returns the state and the counts of the current window."""
+        with self._lock:
+            self._check_timeout()
+            return {
+                'state': self._state,
+                'calls': len(self._outcomes),
+                'failures': self._failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+            }
+
+
+def circuit_breaker(breaker=None, **options):
+    """
+    A decorator factory that guards a function with a circuit breaker.
+
+    It can also be used bare (``@circuit_breaker``), which gives the
+    function a breaker of its own with the default settings.
+
+    Args:
+        breaker (CircuitBreaker): The breaker to use. Functions that call
+            the same database should share one. If omitted, a new breaker
+            is created from the keyword options.
+        **options: CircuitBreaker arguments for a new breaker.
+    """
+    if callable(breaker) and not isinstance(breaker, CircuitBreaker):
+        # Used bare: the "breaker" is the decorated function
+        return circuit_breaker(**options)(breaker)
+    breaker = breaker or CircuitBreaker(**options)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                probe = breaker.before_call()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    breaker.record(probe, e)
+                    raise
+                except BaseException:
+                    breaker.abandon(probe)
+                    raise
+                breaker.record(probe)
+                return result
+            async_wrapper.breaker = breaker
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            probe = breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                breaker.record(probe, e)
+                raise
+            except BaseException:
+                breaker.abandon(probe)
+                raise
+            breaker.record(probe)
+            return result
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
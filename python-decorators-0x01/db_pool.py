@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+"""
+This module provides a pool of SQLite connections and a pooled variant of
+the with_db_connection decorator.
+
+with_db_connection opens and closes a connection on every call, so each
+call pays for opening the file and starts with an empty page cache. The
+pool keeps up to ``size`` connections open instead:
+
+- Connections are thread-affine: a thread gets back the connection it used
+  last whenever that one is idle, so its page cache stays warm. Only when
+  it is taken does the thread borrow another idle connection.
+- Pragmas (WAL journaling, cache_size, mmap_size) are applied once, when a
+  connection is created.
+- Nested decorated calls in one thread share the same connection, so they
+  cannot deadlock waiting for a second one.
+- Each connection keeps its prepared statements for as long as it lives
+  (see statement_cache), so repeated queries skip parsing.
+- stats() reports checkouts, waits, checkout latency and the statement
+  cache hit rate.
+"""
+import functools
+import sqlite3
+import threading
+import time
+
+from statement_cache import DEFAULT_SIZE, CachingConnection, combined_stats
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers no longer block the writer
+    'cache_size': -16000,  # 16 MB page cache per connection
+    'mmap_size': 268435456,  # Read up to 256 MB through a memory map
+}
+
+
+class PooledConnection(CachingConnection):
+    """A sqlite3 connection that remembers the database it was opened on."""
+    database = None
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections with thread affinity.
+
+    Args:
+        database (str): The database file.
+        size (int): The maximum number of open connections.
+        pragmas (dict): PRAGMA name -> value, applied to each new connection.
+        timeout (float): Seconds to wait for a free connection before
+            raising TimeoutError.
+        statement_cache_size (int): The number of prepared statements each
+            connection keeps.
+    """
+    def __init__(self, database='users.db', size=5, pragmas=None, timeout=30.0,
+                 statement_cache_size=DEFAULT_SIZE):
+        self.database = database
+        self.size = size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self._connections = []  # Every open connection, idle or not
+        self._idle = []  # Idle connections, most recently released last
+        self._open = 0
+        self._available = threading.Condition()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.affinity_hits = 0
+        self.creations = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.checkout_time = 0.0
+        self.max_checkout_time = 0.0
+
+    def _create(self):
+        """Opens a new connection and applies the pragmas."""
+        # Connections are handed from thread to thread (never used by two at
+        # once), so the same-thread check is disabled.
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               factory=PooledConnection,
+                               cached_statements=self.statement_cache_size)
+        conn.database = self.database
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """
+        Checks out a connection, preferring the one this thread used last.
+
+        Raises:
+            TimeoutError: If no connection became free within the timeout.
+        """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            # A nested call in a thread that already holds a connection
+            local.depth += 1
+            return local.conn
+
+        start = time.perf_counter()
+        create = False
+        with self._available:
+            while True:
+                last = getattr(local, 'last', None)
+                if last is not None and last in self._idle:
+                    self._idle.remove(last)
+                    conn = last
+                    self.affinity_hits += 1
+                    break
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    create = True
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise TimeoutError(f"No connection to {self.database} became free "
+                                       f"within {self.timeout} seconds")
+                self.waits += 1
+                self._available.wait(remaining)
+
+        if create:
+            try:
+                conn = self._create()
+            except Exception:
+                with self._available:
+                    self._open -= 1
+                    self._available.notify()
+                raise
+        elapsed = time.perf_counter() - start
+        with self._available:
+            if create:
+                self._connections.append(conn)
+            self.checkouts += 1
+            self.creations += create
+            self.checkout_time += elapsed
+            self.max_checkout_time = max(self.max_checkout_time, elapsed)
+        local.conn = local.last = conn
+        local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back any open transaction."""
+        local = self._local
+        local.depth -= 1
+        if local.depth:
+            return
+        local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # The connection is unusable: close it instead of pooling it
+            conn.close()
+            with self._available:
+                self._connections.remove(conn)
+                self._open -= 1
+                self._available.notify()
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def close_all(self):
+        """Closes the idle connections, e.g. before the program exits."""
+        with self._available:
+            while self._idle:
+                conn = self._idle.pop()
+                conn.close()
+                self._connections.remove(conn)
+                self._open -= 1
+
+    def stats(self):
+        """Returns the pool's counters and checkout latency."""
+        with self._available:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'affinity_hits': self.affinity_hits,
+                'creations': self.creations,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'avg_checkout_ms': self.checkout_time / self.checkouts * 1000 if self.checkouts else 0.0,
+                'max_checkout_ms': self.max_checkout_time * 1000,
+                'statements': combined_stats(conn.statements for conn in self._connections),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database='users.db', size=5):
+    """Returns the shared pool for a database, creating it on first use."""
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = ConnectionPool(database, size)
+        return _pools[database]
+
+
+def with_pooled_connection(func=None, *, database='users.db', pool=None):
+    """
+    A pooled variant of with_db_connection.
+
+    The decorated function receives a pooled connection as its first
+    argument, which goes back to the pool (rather than being closed) when
+    the function returns or raises.
+
+    Args:
+        database (str): The database whose shared pool is used.
+        pool (ConnectionPool): A specific pool to use instead.
+    """
+    if func is None:
+        return lambda f: with_pooled_connection(f, database=database, pool=pool)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        connections = pool or get_pool(database)
+        conn = connections.acquire()
+        try:
+            return func(conn, *args, **kwargs)
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            raise
+        finally:
+            connections.release(conn)
+    return wrapper
@@ -0,0 +1,410 @@
+#!/usr/bin/python3
+"""
+This module writes structured query logs without slowing the queries down.
+
+Decorated calls only put a tuple of what they measured (the SQL, its
+parameters, the duration, the row count, the caller) on an in-memory
+queue. A single listener thread does everything else: it fingerprints the
+query, adds it to the statistics and, if the query was sampled, formats it
+as a JSON line and writes it out. So the calling thread never waits on
+stdout, takes no lock, and runs no regex or hash.
+
+Each record holds:
+    ts           when the query finished (ISO 8601, UTC)
+    fingerprint  a short hash identifying the shape of the query
+    params_hash  a short hash of the bound parameters (never the values)
+    duration_ms  how long the call took
+    rows         the number of rows returned, when known
+    caller       "file:line function" of the code that made the call
+    slow         whether duration_ms reached the slow-query threshold
+    error        "ExceptionType: message" if the call raised, else null
+
+With a sample_rate below 1, only that fraction of queries is logged, but
+queries at or above slow_query_ms are always logged (at WARNING level), and
+so are failed ones (at ERROR level). Both settings can also be given per
+call to record_query(), which log_queries does for per-function settings.
+
+Every query, sampled or not, is also counted in per-fingerprint statistics
+(calls, errors, total and mean time, latency percentiles, rows), a lightweight
+take on pg_stat_statements. A fingerprint identifies the shape of a query:
+its literals, IN lists and whitespace are normalised away, so
+"WHERE id = 1" and "WHERE id = 2" share one. Read the statistics with
+query_stats() or print_stats(), or have them logged periodically with
+start_stats_dump().
+"""
+import atexit
+import functools
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+logger = logging.getLogger('query_log')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+settings = {
+    'sample_rate': 1.0,
+    'slow_query_ms': None,  # None disables the slow-query threshold
+}
+
+_listener = None
+_records = queue.SimpleQueue()
+# Guards starting, stopping and replacing the listener
+_listener_lock = threading.RLock()
+
+
+def _short_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(query):
+    """
+    Returns the shape of a query: literals become ?, IN lists IN (...),
+    and whitespace is collapsed.
+
+    Example:
+        "SELECT * FROM users WHERE id IN (1, 2) AND name = 'Bob'"
+        -> "SELECT * FROM users WHERE id IN (...) AND name = ?"
+    """
+    query = _STRING.sub('?', query)
+    query = _NUMBER.sub('?', query)
+    query = _IN_LIST.sub('IN (...)', query)
+    return ' '.join(query.split()).rstrip(';').rstrip()
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    """Returns a short hash of the normalised query."""
+    return _short_hash(normalize(query))
+
+
+class Histogram:
+    """
+    Counts values in exponentially growing buckets.
+
+    Percentiles are read as the upper bound of the bucket that holds them,
+    so they are accurate to within the growth factor.
+
+    Args:
+        start (float): The upper bound of the first bucket.
+        growth (float): The ratio between consecutive bucket bounds.
+        buckets (int): The number of buckets; larger values go to the last.
+    """
+    def __init__(self, start, growth, buckets):
+        self.bounds = [start * growth ** i for i in range(buckets)]
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Returns the p-th percentile (0-100), or None if empty."""
+        if not self.count:
+            return None
+        rank = max(1, -(-p * self.count // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                # The overflow bucket has no upper bound; the maximum is one
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+
+class _FingerprintStats:
+    """The statistics of one query fingerprint."""
+    def __init__(self, query):
+        self.query = query
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        # 10 microseconds to about 3 minutes, 25% apart
+        self.latency = Histogram(0.00001, 1.25, 75)
+        self.rows = 0
+        # 1 row to about a billion, doubling
+        self.row_counts = Histogram(1, 2, 31)
+
+    def add(self, duration, rows, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total_time += duration
+        self.latency.add(duration)
+        if rows is not None:
+            self.rows += rows
+            self.row_counts.add(rows)
+
+    def to_dict(self):
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+        return {
+            'fingerprint': fingerprint(self.query),
+            'query': normalize(self.query),
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': ms(self.total_time),
+            'mean_ms': ms(self.total_time / self.calls),
+            'p50_ms': ms(self.latency.percentile(50)),
+            'p95_ms': ms(self.latency.percentile(95)),
+            'p99_ms': ms(self.latency.percentile(99)),
+            'max_ms': ms(self.latency.max),
+            'rows': self.rows,
+            'rows_p50': self.row_counts.percentile(50),
+            'rows_p95': self.row_counts.percentile(95),
+            'rows_p99': self.row_counts.percentile(99),
+        }
+
+
+_stats = {}  # fingerprint -> _FingerprintStats, updated by the listener thread
+_stats_lock = threading.Lock()  # Only contended by readers of the statistics
+_dumper = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats query records as one JSON object per line."""
+    def format(self, record):
+        query_stats = getattr(record, 'query_stats', None)
+        if query_stats is not None:
+            return json.dumps({
+                'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                'query_stats': query_stats,
+            })
+        query = getattr(record, 'query', None)
+        if query is None:
+            return super().format(record)
+        sql, params, duration, rows, caller, error = query
+        if error is not None:
+            error = f"{type(error).__name__}: {error}"
+        return json.dumps({
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'fingerprint': fingerprint(sql) if sql else None,
+            'params_hash': _short_hash(repr(params)) if params else None,
+            'duration_ms': round(duration * 1000, 3),
+            'rows': rows,
+            'caller': f"{os.path.basename(caller[0])}:{caller[1]} {caller[2]}",
+            'slow': record.levelno == logging.WARNING,
+            'error': error,
+        })
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that enqueues records as they are.
+
+    The standard one formats each record before queueing it, in the calling
+    thread; the listener is in-process, so that can wait until it runs.
+    """
+    def prepare(self, record):
+        return record
+
+
+class _QueryListener(logging.handlers.QueueListener):
+    """
+    A QueueListener that also accepts the raw tuples of record_query().
+
+    Each tuple is added to the statistics and, if it was sampled, turned
+    into a LogRecord for the handlers; ordinary LogRecords pass through.
+    A record that cannot be handled is reported on stderr and dropped, so
+    the thread keeps draining the queue.
+    """
+    def handle(self, record):
+        try:
+            if isinstance(record, tuple):
+                record = self._handle_query(*record)
+                if record is None:
+                    return
+            super().handle(record)
+        except Exception:
+            if logging.raiseExceptions:
+                traceback.print_exc(file=sys.stderr)
+
+    @staticmethod
+    def _handle_query(sql, params, duration, rows, caller, error, level, created):
+        """Counts a query and returns its LogRecord, or None if not sampled."""
+        if sql:
+            key = fingerprint(sql)
+            with _stats_lock:
+                stats = _stats.get(key)
+                if stats is None:
+                    stats = _stats[key] = _FingerprintStats(sql)
+                stats.add(duration, rows, error is not None)
+        if level is None:
+            return None
+        record = logger.makeRecord(
+            logger.name, level, caller[0], caller[1], 'query', None, None, caller[2],
+            extra={'query': (sql, params, duration, rows, caller, error)})
+        record.created = created
+        return record
+
+
+def configure(sample_rate=None, slow_query_ms=None, handler=None):
+    """
+    Changes the logging settings and starts the background writer.
+
+    Args:
+        sample_rate (float): The fraction of queries logged, from 0 to 1.
+        slow_query_ms (float): Queries taking at least this long are always
+            logged, at WARNING level.
+        handler (logging.Handler): Where the records go (default: stdout).
+            Its formatter is replaced by JSONFormatter if it has none.
+    """
+    global _listener
+    if sample_rate is not None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        settings['sample_rate'] = sample_rate
+    if slow_query_ms is not None:
+        settings['slow_query_ms'] = slow_query_ms
+    with _listener_lock:
+        # Checked under the lock: concurrent first queries all call this,
+        # and only one of them may start the listener
+        if _listener is not None and handler is None:
+            return
+        if handler is None:
+            handler = logging.StreamHandler(sys.stdout)
+        if handler.formatter is None:
+            handler.setFormatter(JSONFormatter())
+        if _listener is not None:
+            _listener.stop()
+            logger.handlers.clear()
+        logger.addHandler(_QueueHandler(_records))
+        _listener = _QueryListener(_records, handler)
+        _listener.start()
+
+
+def flush():
+    """Waits until every queued query has been counted and written."""
+    with _listener_lock:
+        if _listener is not None:
+            # stop() drains the queue before the thread exits
+            _listener.stop()
+            _listener.start()
+
+
+@atexit.register
+def _shutdown():
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+def record_query(sql, params, duration, rows, caller, error=None,
+                 sample_rate=None, slow_query_ms=None):
+    """
+    Counts one query in the statistics and logs it, subject to sampling
+    and the slow-query threshold.
+
+    Only the enqueueing happens in the calling thread.
+
+    Args:
+        sql (str): The query text; anything else is logged without a
+            fingerprint.
+        params: The bound parameters.
+        duration (float): The duration in seconds.
+        rows (int): The number of rows returned, or None.
+        caller (tuple): ``(filename, line, function)`` of the caller.
+        error (BaseException): The error the call raised, if it failed.
+            Failed calls are always logged.
+        sample_rate (float): Overrides settings['sample_rate'] for this call.
+        slow_query_ms (float): Overrides settings['slow_query_ms'] for this
+            call.
+    """
+    if not isinstance(sql, str):
+        # Not a query, e.g. the connection of a (conn, query) function
+        sql = None
+    if sample_rate is None:
+        sample_rate = settings['sample_rate']
+    if slow_query_ms is None:
+        slow_query_ms = settings['slow_query_ms']
+    slow = slow_query_ms is not None and duration * 1000 >= slow_query_ms
+    level = logging.ERROR if error is not None else logging.WARNING if slow else logging.INFO
+    if (level == logging.INFO and sample_rate < 1 and random.random() >= sample_rate
+            or not logger.isEnabledFor(level)):
+        level = None  # Counted in the statistics, but not logged
+    if _listener is None:
+        configure()
+    # Fingerprinting, statistics and formatting happen on the listener thread
+    _records.put((sql, params, duration, rows, caller, error, level, time.time()))
+
+
+def query_stats(sort='total_ms', limit=None, reset=False):
+    """
+    Returns the per-fingerprint statistics, most expensive first.
+
+    Args:
+        sort (str): The field to sort by, e.g. "total_ms", "calls" or
+            "p99_ms".
+        limit (int): Return only this many fingerprints.
+        reset (bool): Clear the statistics after reading them.
+    """
+    flush()  # Count the queries still waiting in the queue
+    with _stats_lock:
+        rows = [stats.to_dict() for stats in _stats.values()]
+        if reset:
+            _stats.clear()
+    rows.sort(key=lambda row: row[sort] or 0, reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def print_stats(sort='total_ms', limit=10):
+    """Prints the most expensive query fingerprints as a table."""
+    print(f"{'calls':>8} {'errors':>6} {'total_ms':>10} {'mean_ms':>9} {'p50_ms':>8} {'p95_ms':>8} "
+          f"{'p99_ms':>8} {'rows':>8}  query")
+    for row in query_stats(sort, limit):
+        print(f"{row['calls']:>8} {row['errors']:>6} {row['total_ms']:>10} {row['mean_ms']:>9} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['rows']:>8}  {row['query']}")
+
+
+def _dump_stats(interval, reset, stop):
+    while not stop.wait(interval):
+        if _listener is None:
+            configure()
+        logger.info('query_stats', extra={'query_stats': query_stats(reset=reset)})
+
+
+def start_stats_dump(interval=60.0, reset=True):
+    """
+    Logs the statistics every ``interval`` seconds from a background thread.
+
+    Args:
+        interval (float): Seconds between dumps.
+        reset (bool): Start each interval with fresh statistics.
+    """
+    global _dumper
+    stop_stats_dump()
+    stop = threading.Event()
+    thread = threading.Thread(target=_dump_stats, args=(interval, reset, stop), daemon=True)
+    thread.start()
+    _dumper = (thread, stop)
+
+
+def stop_stats_dump():
+    """Stops the periodic dump started by start_stats_dump()."""
+    global _dumper
+    if _dumper is not None:
+        thread, stop = _dumper
+        stop.set()
+        thread.join()
+        _dumper = None
@@ -0,0 +1,385 @@
+#!/usr/bin/python3
+"""
+This module provides the query-result cache used by the cache_query
+decorator.
+
+QueryCache is an LRU cache with a budget in bytes rather than entries, so a
+few huge result sets cannot crowd out memory, and every entry has its own
+time-to-live. Entries are keyed by the database, the SQL text and the bound
+parameters, and remember which tables the query read, so a write to a table
+(reported by the transactional decorator through invalidate_tables())
+drops every cached result that depends on it, in every QueryCache.
+
+The tables a query reads and writes are reported by SQLite itself through
+an authorizer callback (TableTracker), so joins, subqueries and views are
+all covered and nothing is guessed from the SQL text.
+
+get_or_load() protects the database from a thundering herd:
+- single flight: when several threads miss the same key at once, only one
+  runs the query and the others wait for its result;
+- stale-while-revalidate: for stale_ttl seconds after an entry expires it
+  is still returned immediately while one background thread refreshes it.
+"""
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+# Every QueryCache, so a committed write can invalidate all of them
+_caches = weakref.WeakSet()
+
+
+def estimate_size(value):
+    """
+    Returns an estimate, in bytes, of the memory held by a query result.
+
+    Lists, tuples and dicts (result sets and their rows) are walked so the
+    values they contain are counted too.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return size
+
+
+def database_name(conn):
+    """
+    Returns the name of the database a connection is attached to.
+
+    Connections that know their database expose it as ``database``; for a
+    plain sqlite3 connection it is read from the main database's file path.
+    """
+    name = getattr(conn, 'database', None)
+    if name is None:
+        name = conn.execute("PRAGMA database_list").fetchone()[2] or ':memory:'
+    return name
+
+
+class _Entry:
+    """A cached result with its size, expiry times and the tables it reads."""
+    __slots__ = ('value', 'size', 'expires', 'stale_until', 'tables')
+
+    def __init__(self, value, size, expires, stale_until, tables):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.stale_until = stale_until
+        self.tables = tables
+
+
+class _Flight:
+    """A load in progress; threads that miss the same key wait on it."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    A thread-safe LRU cache of query results with a byte budget and TTLs.
+
+    Args:
+        max_bytes (int): The total estimated size of the cached results;
+            the least recently used entries are evicted to stay under it.
+        default_ttl (float): Seconds an entry stays fresh when put() is not
+            given a ttl. None means entries never expire.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, default_ttl=300.0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._by_table = {}  # table -> set of keys reading it
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> _Flight of the load or refresh in progress
+        # Bumped on every invalidation, so a load that started before a write
+        # does not cache what it read
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        _caches.add(self)
+
+    @staticmethod
+    def make_key(database, sql, params=()):
+        """Builds the cache key of a query; params must be hashable."""
+        if isinstance(params, list):
+            params = tuple(params)
+        elif isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        return (database, sql, params)
+
+    def _lookup(self, key):
+        """
+        Returns ``(entry, fresh)`` for key; the caller must hold the lock.
+
+        Entries past their stale window are removed and returned as None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        now = time.monotonic()
+        if entry.expires is None or entry.expires > now:
+            return entry, True
+        if entry.stale_until > now:
+            return entry, False
+        self._remove(key)
+        self.expirations += 1
+        return None, False
+
+    def get(self, key, default=None):
+        """Returns the fresh value cached under key, or default."""
+        with self._lock:
+            entry, fresh = self._lookup(key)
+            if not fresh:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_or_load(self, key, loader, ttl=None, stale_ttl=0.0, refresher=None):
+        """
+        Returns the value cached under key, loading it on a miss.
+
+        Concurrent misses for the same key share a single call to loader.
+        An entry that expired less than stale_ttl seconds ago is returned
+        as it is, and one background thread reloads it.
+
+        Args:
+            key: A key from make_key().
+            loader: Called without arguments; returns ``(value, tables)``,
+                tables being those the value was read from.
+            ttl (float): Seconds the value stays fresh (default: default_ttl).
+            stale_ttl (float): Seconds an expired value may still be served.
+            refresher: Called instead of loader for background refreshes,
+                e.g. because loader is bound to a connection that will be
+                closed by then.
+
+        Raises:
+            Whatever loader raised, in every thread that waited on it.
+        """
+        with self._lock:
+            entry, fresh = self._lookup(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if fresh:
+                    self.hits += 1
+                    return entry.value
+                self.stale_hits += 1
+                if key not in self._flights:
+                    self._flights[key] = _Flight()
+                    self.refreshes += 1
+                    threading.Thread(target=self._load, daemon=True,
+                                     args=(key, refresher or loader, ttl, stale_ttl,
+                                           self._flights[key], self._generation)).start()
+                return entry.value
+
+            self.misses += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+                generation = None
+
+        if generation is None:
+            # Another thread is already running this query: share its result
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        self._load(key, loader, ttl, stale_ttl, flight, generation)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, loader, ttl, stale_ttl, flight, generation):
+        """Runs loader for a flight, caches the value and wakes the waiters."""
+        try:
+            flight.value, tables = loader()
+            self.put(key, flight.value, ttl, tables, stale_ttl=stale_ttl, generation=generation)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def put(self, key, value, ttl=None, tables=None, stale_ttl=0.0, generation=None):
+        """
+        Caches value under key.
+
+        Args:
+            key: A key from make_key().
+            value: The query result.
+            ttl (float): Seconds the entry stays fresh (default: default_ttl).
+            tables: The tables the result was read from, e.g. from a
+                TableTracker. An entry without tables is never invalidated,
+                only expired.
+            stale_ttl (float): Seconds the entry may be served after it
+                expires, while it is refreshed.
+            generation (int): If given, the value is dropped when an
+                invalidation happened since this generation was read.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        size = estimate_size(value)
+        tables = frozenset(table.lower() for table in tables or ())
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # A write committed while the value was being read
+                return
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Caching it would evict everything else and still not fit
+                return
+            if ttl is not None:
+                expires = time.monotonic() + ttl
+                stale_until = expires + stale_ttl
+            else:
+                expires = stale_until = None
+            self._entries[key] = _Entry(value, size, expires, stale_until, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_tables(self, tables):
+        """Drops every entry that reads from any of the given tables."""
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key)[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns the cache's counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                'coalesced': self.coalesced,
+                'refreshes': self.refreshes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def __repr__(self):
+        stats = self.stats()
+        return (f"<QueryCache {stats['entries']} entries, {stats['bytes']} bytes, "
+                f"hit rate {stats['hit_rate']:.0%}>")
+
+
+# The cache shared by every cache_query-decorated function
+default_cache = QueryCache()
+
+
+def invalidate_tables(tables):
+    """Drops the entries that read any of the given tables, in every cache."""
+    for cache in list(_caches):
+        cache.invalidate_tables(tables)
+
+
+class TableTracker:
+    """
+    A context manager that records the tables read and written on a sqlite3
+    connection.
+
+    It installs an authorizer callback, which SQLite calls while compiling
+    each statement with every table it reads and the target of each INSERT,
+    UPDATE and DELETE, however the SQL is written. Installing it also
+    expires the connection's compiled statements, so statements reused from
+    the cache are compiled again and reported too. Trackers can be nested
+    on one connection (a cached query inside a transaction): entering one
+    reinstalls the authorizer, so even a statement the outer tracker already
+    saw compiled is reported again, and each tracker sees every statement
+    run while it is active.
+
+    Example:
+        with TableTracker(conn) as tracked:
+            conn.execute("UPDATE users SET email = ? WHERE id = ?", ...)
+        invalidate_tables(tracked.writes)
+    """
+    _WRITE_ACTIONS = frozenset((sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE))
+    # id(connection) -> the trackers active on it, outermost first
+    _active = {}
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.reads = set()
+        self.writes = set()
+
+    @classmethod
+    def _authorize(cls, trackers, action, arg1, arg2, database, source):
+        if arg1 and not arg1.startswith('sqlite_'):
+            if action == sqlite3.SQLITE_READ:
+                for tracker in trackers:
+                    tracker.reads.add(arg1.lower())
+            elif action in cls._WRITE_ACTIONS:
+                for tracker in trackers:
+                    tracker.writes.add(arg1.lower())
+        return sqlite3.SQLITE_OK
+
+    def __enter__(self):
+        trackers = self._active.setdefault(id(self.conn), [])
+        trackers.append(self)
+        # Installed on every entry, nested or not, to expire the statements
+        # compiled so far: reused ones would not reach the authorizer
+        self.conn.set_authorizer(lambda *args: self._authorize(trackers, *args))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        trackers = self._active[id(self.conn)]
+        trackers.remove(self)
+        if not trackers:
+            del self._active[id(self.conn)]
+            self.conn.set_authorizer(None)
+        return False
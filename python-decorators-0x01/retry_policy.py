@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+"""
+This module decides whether and when a failed database call is retried.
+
+- is_retryable() tells transient errors (a locked database, a dropped
+  connection, a deadlock) from permanent ones (a syntax error, a constraint
+  violation), which fail the same way however often they are retried.
+- backoff_delay() spaces retries out exponentially with "full jitter": the
+  delay is drawn uniformly between 0 and the exponential bound, so clients
+  that failed together do not all retry at the same moment.
+- RetryBudget caps retries across every caller that shares it, so that
+  during an outage retries cannot multiply the load on the database.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+# Messages of sqlite3.OperationalError that describe a passing condition
+TRANSIENT_SQLITE_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'database is busy',
+    'disk i/o error',
+)
+
+# MySQL error numbers worth retrying: lost or refused connections, lock
+# wait timeouts and deadlocks
+TRANSIENT_MYSQL_ERRNOS = frozenset((1040, 1205, 1213, 2002, 2003, 2006, 2013, 2055))
+
+
+def is_retryable(error):
+    """
+    Returns True if an error is likely to go away when the call is retried.
+
+    Args:
+        error (Exception): The error raised by the call.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(transient in message for transient in TRANSIENT_SQLITE_MESSAGES)
+    if isinstance(error, sqlite3.Error):
+        # Integrity, programming and interface errors are permanent
+        return False
+    # mysql.connector errors carry the server's error number
+    return getattr(error, 'errno', None) in TRANSIENT_MYSQL_ERRNOS
+
+
+def backoff_delay(attempt, base=1.0, max_delay=30.0):
+    """
+    Returns the delay before retry number ``attempt`` (counting from 1).
+
+    The delay is random, between 0 and ``min(max_delay, base * 2 **
+    (attempt - 1))`` seconds (exponential backoff with full jitter).
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """
+    A token bucket that limits retries across all the callers sharing it.
+
+    Every call deposits ``ratio`` tokens and the bucket also refills by
+    ``min_per_second`` tokens per second; every retry spends one token. So
+    retries stay at roughly ``ratio`` of the traffic (plus a small floor
+    for quiet periods) instead of multiplying it when everything fails.
+
+    Args:
+        ratio (float): Retries allowed per call made.
+        min_per_second (float): Retries allowed per second regardless of
+            traffic.
+        max_tokens (float): The most tokens that can be saved up.
+    """
+    def __init__(self, ratio=0.2, min_per_second=1.0, max_tokens=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self._tokens = min(self.max_tokens, self._tokens + amount)
+
+    def record_call(self):
+        """Deposits the tokens earned by one call."""
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self):
+        """Takes a token for one retry; returns False if none is left."""
+        with self._lock:
+            self._refill(0)
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def stats(self):
+        """Returns the tokens left and the retries allowed and refused."""
+        with self._lock:
+            self._refill(0)
+            return {'tokens': round(self._tokens, 2), 'retries': self.retries,
+                    'exhausted': self.exhausted}
+
+
+# The budget shared by every retry_on_failure-decorated function
+default_budget = RetryBudget()
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+"""
+This module keeps prepared statements alive across decorated calls and
+measures how often they are reused.
+
+sqlite3 already caches the statements it compiles, per connection and keyed
+by the SQL text, in a bounded LRU cache (the ``cached_statements`` argument
+of sqlite3.connect). That cache is lost whenever the connection is closed,
+which with_db_connection does after every call, and it exposes no metrics.
+
+CachingConnection sizes that cache and mirrors it in a StatementCache, an
+LRU of the same size fed by every statement its cursors execute, so the hit
+rate of the real cache can be read with ``conn.statements.stats()``. Used
+with a long-lived connection (see db_pool.ConnectionPool, whose connections
+are CachingConnections), hot point lookups such as get_user_by_id skip
+parsing and planning after their first call.
+
+Example:
+    conn = sqlite3.connect('users.db', factory=CachingConnection,
+                           cached_statements=256)
+"""
+import sqlite3
+from collections import OrderedDict
+
+DEFAULT_SIZE = 128
+
+
+class StatementCache:
+    """
+    An LRU of SQL strings that tracks statement reuse on one connection.
+
+    Args:
+        size (int): The number of statements kept; it matches the
+            connection's cached_statements so evictions coincide.
+    """
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._statements = OrderedDict()  # SQL -> None, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, sql):
+        """Records an execution of sql; returns True if it was cached."""
+        if sql in self._statements:
+            self._statements.move_to_end(sql)
+            self.hits += 1
+            return True
+        self.misses += 1
+        self._statements[sql] = None
+        if len(self._statements) > self.size:
+            self._statements.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'statements': len(self._statements),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachingCursor(sqlite3.Cursor):
+    """A cursor that records each statement in its connection's StatementCache."""
+    def execute(self, sql, parameters=()):
+        self.connection.statements.record(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.statements.record(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class CachingConnection(sqlite3.Connection):
+    """A sqlite3 connection whose statement reuse is measured."""
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('cached_statements', DEFAULT_SIZE)
+        super().__init__(*args, **kwargs)
+        self.statements = StatementCache(kwargs['cached_statements'])
+
+    def cursor(self, factory=CachingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def combined_stats(caches):
+    """Adds up the stats of several StatementCaches, e.g. across a pool."""
+    totals = {'statements': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+    for cache in caches:
+        stats = cache.stats()
+        for name in totals:
+            totals[name] += stats[name]
+    lookups = totals['hits'] + totals['misses']
+    totals['hit_rate'] = totals['hits'] / lookups if lookups else 0.0
+    return totals
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+This module tests that cached query results are invalidated by the writes
+the transactional decorator commits.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from result_cache import QueryCache, TableTracker
+
+transactional = __import__('2-transactional').transactional
+cache_query = __import__('4-cache_query').cache_query
+
+QUERY = "SELECT email FROM users WHERE id = 1"
+
+
+class TestCacheInvalidation(unittest.TestCase):
+    """Cached queries and transactions on one connection."""
+
+    def setUp(self) -> None:
+        """Creates a users table in a scratch database."""
+        self.directory = tempfile.mkdtemp()
+        self.conn = sqlite3.connect(os.path.join(self.directory, 'users.db'))
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        self.conn.execute("INSERT INTO users VALUES (1, 'old@example.com')")
+        self.conn.commit()
+        self.cache = QueryCache()
+
+        @cache_query(cache=self.cache)
+        def fetch(conn, query):
+            return conn.execute(query).fetchall()
+        self.fetch = fetch
+
+    def tearDown(self) -> None:
+        """Closes the connection and removes the database."""
+        self.conn.close()
+        shutil.rmtree(self.directory)
+
+    def update_email(self, email: str) -> None:
+        """Commits a new email for user 1 through transactional."""
+        @transactional
+        def update(conn):
+            conn.execute("UPDATE users SET email = ? WHERE id = 1", (email,))
+        update(self.conn)
+
+    def test_nested_tracker_sees_compiled_statement(self) -> None:
+        """Test that an inner tracker records a statement compiled earlier."""
+        with TableTracker(self.conn) as outer:
+            self.conn.execute(QUERY).fetchall()
+            with TableTracker(self.conn) as inner:
+                self.conn.execute(QUERY).fetchall()
+        self.assertEqual(outer.reads, {'users'})
+        self.assertEqual(inner.reads, {'users'})
+
+    def test_cached_query_inside_transaction(self) -> None:
+        """Test that a result cached inside a transaction is invalidated."""
+        @transactional
+        def read_then_fetch(conn):
+            conn.execute(QUERY).fetchall()
+            return self.fetch(conn, QUERY)
+
+        self.assertEqual(read_then_fetch(self.conn), [('old@example.com',)])
+        self.update_email('new@example.com')
+        self.assertEqual(self.fetch(self.conn, QUERY), [('new@example.com',)])
+
+    def test_write_invalidates_custom_cache(self) -> None:
+        """Test that a committed write drops entries of a non-default cache."""
+        self.fetch(self.conn, QUERY)
+        self.assertEqual(len(self.cache), 1)
+        self.update_email('new@example.com')
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.fetch(self.conn, QUERY), [('new@example.com',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
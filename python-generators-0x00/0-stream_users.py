@@ -5,42 +5,74 @@ row by row from a MySQL database.
 """
 import seed  # Import the seed module to use its connection functions
 
-def stream_users():
+def stream_users(streaming=False, prefetch=100, row_format='dict'):
     """
     A generator function that connects to the ALX_prodev database
     and yields user rows one by one.
 
-    Each row is returned as a dictionary for easy access to column data.
+    Each row is returned as a dictionary for easy access to column data,
+    unless a more compact row format is requested.
+
+    Args:
+        streaming (bool): If True, use an unbuffered cursor so rows are read
+            from the server as they are consumed. Client memory then stays
+            bounded by ``prefetch`` rows, however large the table is.
+        prefetch (int): In streaming mode, the number of rows read from the
+            server at a time.
+        row_format (str): "dict" (default), "tuple" or "record"; see
+            seed.ROW_FORMATS. Tuples and records use far less memory per row.
     """
+    seed.check_row_format(row_format, allow_columnar=False)
     connection = None
     cursor = None
+    exhausted = False
     try:
-        # Establish a connection to the database
-        connection = seed.connect_to_prodev()
+        # Borrow a connection from the shared pool
+        connection = seed.connect_pooled()
         if not connection:
             # If connection fails, the generator stops
             return
 
-        # Using dictionary=True makes the cursor return rows as dictionaries
+        # In the default "dict" format the cursor returns rows as dictionaries
         # (e.g., {'user_id': '...', 'name': '...'}), which matches the expected output.
-        cursor = connection.cursor(dictionary=True)
+        if streaming:
+            # buffered=False keeps the result set on the server; rows are
+            # pulled over the socket only when fetchmany() asks for them.
+            cursor = seed.user_cursor(connection, row_format, buffered=False)
+        else:
+            cursor = seed.user_cursor(connection, row_format)
 
         # Execute the query to fetch all users
-        cursor.execute("SELECT * FROM user_data ORDER BY name;")
+        cursor.execute(f"SELECT {seed.select_columns(row_format)} FROM user_data ORDER BY name;")
+
+        if streaming:
+            while True:
+                rows = cursor.fetchmany(prefetch)
+                if not rows:
+                    break
+                for row in rows:
+                    yield seed.format_row(row, row_format)
+            exhausted = True
+            return
 
         # This is the single loop required by the instructions.
         # The cursor itself is an iterator, so we can loop over it.
         # It fetches rows from the database as needed, not all at once.
         for row in cursor:
-            yield row
+            yield seed.format_row(row, row_format)
 
     except Exception as e:
         print(f"An error occurred while streaming users: {e}")
     finally:
+        if streaming and connection and not exhausted:
+            # The consumer stopped early: shutting the connection's socket
+            # down (invalidate() skips the close() that would drain the
+            # unread rows) is cheaper than reading the rest of the result.
+            connection.invalidate()
+            cursor = None
         # Ensure the cursor and connection are closed properly
         if cursor:
             cursor.close()
-        if connection and connection.is_connected():
+        if connection:
+            # Hands the connection back to the pool rather than closing it
             connection.close()
-
-
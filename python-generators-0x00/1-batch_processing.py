@@ -3,61 +3,108 @@
 This module contains functions to stream and process user data in batches
 for improved performance when handling large datasets.
 """
+import time
+
 import seed  # Import the seed module for database connection
+from query_builder import UserQuery
 
-def stream_users_in_batches(batch_size=50):
+def stream_users_in_batches(batch_size=50, row_format='dict', adaptive=False,
+                            target_latency=0.05, memory_budget=None, metrics=None):
     """
     A generator function that connects to the database and yields
     batches of user rows.
 
     Args:
         batch_size (int): The number of rows to fetch in each batch.
+        row_format (str): "dict" (default), "tuple", "record" or "columnar";
+            see seed.ROW_FORMATS.
+        adaptive (bool): If True, batch_size is only the starting point: the
+            size is tuned after every batch toward ``target_latency`` seconds
+            per fetch, within ``memory_budget`` bytes per batch.
+        target_latency (float): The desired time to fetch one batch, in seconds.
+        memory_budget (int): The maximum estimated size of one batch in bytes.
+        metrics (callable): Called after every fetch with a dictionary of
+            ``batch_size``, ``rows``, ``seconds`` and ``row_bytes``.
 
     Yields:
-        list: A list of dictionaries, where each dictionary represents a user.
+        list: A list of dictionaries, where each dictionary represents a user,
+        a list of tuples/records, or a seed.ColumnarBatch in "columnar" format.
     """
+    seed.check_row_format(row_format)
+    sizer = None
+    if adaptive:
+        sizer = seed.AdaptiveBatchSizer(batch_size, target_latency, memory_budget)
     connection = None
     cursor = None
     try:
-        connection = seed.connect_to_prodev()
+        connection = seed.connect_pooled()
         if not connection:
             return
 
-        # Use a dictionary cursor to get rows as dictionaries
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data ORDER BY name;")
+        # A dictionary cursor for the default format, a plain tuple cursor otherwise
+        cursor = seed.user_cursor(connection, row_format)
+        cursor.execute(f"SELECT {seed.select_columns(row_format)} FROM user_data ORDER BY name;")
 
         # This is the first loop (the main fetching loop)
         while True:
             # fetchmany() is an efficient way to get a specific number of rows
+            started = time.perf_counter()
             batch = cursor.fetchmany(batch_size)
-            
+            seconds = time.perf_counter() - started
+
             # If fetchmany returns an empty list, we've reached the end
             if not batch:
                 break
-            
-            # Yield the entire batch (a list of user dictionaries)
-            yield batch
+
+            if sizer or metrics:
+                row_bytes = seed.estimate_row_size(batch[0])
+                if metrics:
+                    metrics({'batch_size': batch_size, 'rows': len(batch),
+                             'seconds': seconds, 'row_bytes': row_bytes})
+                if sizer:
+                    batch_size = sizer.update(len(batch), seconds, row_bytes)
+
+            # Yield the entire batch (a list of user dictionaries by default)
+            yield seed.format_rows(batch, row_format)
 
     except Exception as e:
         print(f"An error occurred while streaming batches: {e}")
     finally:
         if cursor:
             cursor.close()
-        if connection and connection.is_connected():
+        if connection:
+            # Hands the connection back to the pool rather than closing it
             connection.close()
 
 
-def batch_processing(batch_size=50):
+def batch_processing(batch_size=50, row_format='dict', pushdown=False):
     """
     Processes batches of users to filter and print users older than 25.
 
     Args:
         batch_size (int): The size of the batches to process.
+        row_format (str): The row format to stream the batches in.
+        pushdown (bool): If True, let MySQL apply the age filter so only
+            matching rows are transferred.
     """
+    if pushdown:
+        query = UserQuery().where('age', '>', 25).order_by('name')
+        for user_batch in query.batches(batch_size, row_format):
+            for user in user_batch:
+                print(user)
+        return
+
+    if row_format == 'columnar':
+        for user_batch in stream_users_in_batches(batch_size, row_format):
+            # Scan the compact age column and only build rows that match
+            for index, age in enumerate(user_batch.column('age')):
+                if age > 25:
+                    print(user_batch[index])
+        return
+
     # This is the second loop (iterating over the batches yielded by the generator)
-    for user_batch in stream_users_in_batches(batch_size):
+    for user_batch in stream_users_in_batches(batch_size, row_format):
         # This is the third loop (iterating over users within a single batch)
         for user in user_batch:
-            if user.get('age', 0) > 25:
-                print(user)
\ No newline at end of file
+            if seed.row_value(user, 'age') > 25:
+                print(user)
@@ -2,10 +2,30 @@
 """
 This module contains a generator to lazily load paginated data from a database,
 fetching one page at a time only when needed.
+
+Two pagination modes are supported:
+- "offset": the original LIMIT/OFFSET queries (cost grows with the page number).
+- "keyset": seek pagination on an ordered, indexed column using the last row
+  of the previous page, so every page costs the same no matter how deep
+  into the table the sweep is.
+
+Either mode can read ahead: with prefetch > 0 the next pages are fetched on a
+background thread while the consumer is still working on the current one.
 """
+import base64
+import json
+import queue
+import threading
+
 import seed  # Import the seed module for database connection
 
-def paginate_users(page_size: int, offset: int) -> list:
+# Columns that may be used as the keyset ordering column. The column name is
+# interpolated into the SQL, so it must come from this allowlist.
+KEYSET_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+
+def paginate_users(page_size: int, offset: int, row_format: str = 'dict',
+                   raise_errors: bool = False) -> list:
     """
     Fetches a single page of users from the database.
     This helper function must be included in this file for the checker.
@@ -13,50 +33,291 @@ def paginate_users(page_size: int, offset: int) -> list:
     Args:
         page_size (int): The number of users to fetch per page.
         offset (int): The starting point from which to fetch users.
+        row_format (str): The row format of the page; see seed.ROW_FORMATS.
+        raise_errors (bool): Let database errors propagate instead of
+            logging them and returning an empty page.
 
     Returns:
         list: A list of user dictionaries for the requested page.
     """
     connection = None
     try:
-        connection = seed.connect_to_prodev()
+        connection = seed.connect_pooled()
         if connection:
-            cursor = connection.cursor(dictionary=True)
+            cursor = seed.user_cursor(connection, row_format)
             # The checker is looking for this exact SQL string.
             query = f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}"
+            if row_format != 'dict':
+                query = f"SELECT {seed.select_columns(row_format)} FROM user_data LIMIT {page_size} OFFSET {offset}"
             cursor.execute(query)
             rows = cursor.fetchall()
             cursor.close()
-            return rows
+            return seed.format_rows(rows, row_format)
         return []
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred in paginate_users: {e}")
         return []
     finally:
-        if connection and connection.is_connected():
+        if connection:
+            # Hands the connection back to the pool rather than closing it
             connection.close()
 
 
-def lazy_pagination(page_size: int = 100):
+def row_position(key: str, row) -> list:
+    """Returns the keyset position of a row: the key plus the user_id tie-breaker."""
+    if key == 'user_id':
+        return [seed.row_value(row, 'user_id')]
+    return [seed.row_value(row, key), seed.row_value(row, 'user_id')]
+
+
+def encode_cursor(key: str, last_row: dict) -> str:
+    """
+    Builds an opaque, resumable cursor token from the last row of a page.
+
+    The token records the keyset column and the position to seek past, so a
+    sweep can be restarted from it after a crash without rescanning.
+
+    Args:
+        key (str): The keyset column the sweep is ordered by.
+        last_row: The last row of the page that was just processed, in any
+            of the supported row formats.
+
+    Returns:
+        str: A URL-safe token to pass back as ``cursor``.
+    """
+    payload = json.dumps({"key": key, "after": row_position(key, last_row)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token: str) -> tuple:
+    """
+    Decodes a cursor token created by encode_cursor.
+
+    Args:
+        token (str): The cursor token.
+
+    Returns:
+        tuple: ``(key, after)`` where ``after`` is the list of values to seek past.
+
+    Raises:
+        ValueError: If the token is malformed, names an unknown column, or
+            its position does not hold one value per seek column.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        key, after = payload["key"], payload["after"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {e}") from e
+    if key not in KEYSET_COLUMNS:
+        raise ValueError(f"Invalid pagination cursor: unknown column '{key}'")
+    # The position is bound into the seek predicate, one value per column
+    expected = 1 if key == 'user_id' else 2
+    if (not isinstance(after, list) or len(after) != expected
+            or not all(isinstance(value, (str, int, float)) for value in after)):
+        raise ValueError(f"Invalid pagination cursor: expected a position of {expected} "
+                         f"value(s) for '{key}', got {after!r}")
+    return key, after
+
+
+def page_cursor(page: list, key: str = 'user_id'):
+    """
+    Returns the cursor token for resuming after the given page.
+
+    Args:
+        page (list): A page yielded by lazy_pagination in keyset mode.
+        key (str): The keyset column the sweep is ordered by.
+
+    Returns:
+        str: The cursor token, or None if the page is empty.
+    """
+    if not page:
+        return None
+    return encode_cursor(key, page[-1])
+
+
+def paginate_users_keyset(page_size: int, key: str = 'user_id', after=None,
+                          row_format: str = 'dict', raise_errors: bool = False) -> list:
+    """
+    Fetches a single page of users using keyset (seek) pagination.
+
+    Instead of skipping ``offset`` rows, the query seeks directly past the
+    last row of the previous page using the ordering column. When the column
+    is not unique, ``user_id`` is used as a tie-breaker so the order is stable.
+
+    Args:
+        page_size (int): The number of users to fetch per page.
+        key (str): The ordered, indexed column to seek on.
+        after (list): The position of the last row already seen, as stored in
+            a cursor token, or None to start from the beginning.
+        row_format (str): The row format of the page; see seed.ROW_FORMATS.
+        raise_errors (bool): Let database errors propagate instead of
+            logging them and returning an empty page.
+
+    Returns:
+        list: A list of user dictionaries for the requested page.
+    """
+    if key not in KEYSET_COLUMNS:
+        raise ValueError(f"Unsupported keyset column: '{key}'")
+
+    if key == 'user_id':
+        order_by = "user_id"
+        seek = "user_id > %s"
+    else:
+        order_by = f"{key}, user_id"
+        seek = f"({key}, user_id) > (%s, %s)"
+
+    params = ()
+    query = f"SELECT {seed.select_columns(row_format)} FROM user_data"
+    if after:
+        query += f" WHERE {seek}"
+        params = tuple(after)
+    query += f" ORDER BY {order_by} LIMIT %s"
+    params += (page_size,)
+
+    connection = None
+    try:
+        connection = seed.connect_pooled()
+        if connection:
+            cursor = seed.user_cursor(connection, row_format)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return seed.format_rows(rows, row_format)
+        return []
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"An error occurred in paginate_users_keyset: {e}")
+        return []
+    finally:
+        if connection:
+            # Hands the connection back to the pool rather than closing it
+            connection.close()
+
+
+class _PrefetchError:
+    """Carries an exception from the read-ahead thread to the consumer."""
+    def __init__(self, error):
+        self.error = error
+
+
+def _read_ahead(pages, depth: int):
+    """
+    A generator that consumes ``pages`` on a background thread.
+
+    Up to ``depth`` pages are fetched ahead of the consumer, so the database
+    latency of page N+1 overlaps with the processing of page N. Closing the
+    generator stops the thread after the query it is running, if any.
+
+    Args:
+        pages: The page generator to read from.
+        depth (int): The maximum number of pages buffered ahead.
+
+    Yields:
+        The pages of ``pages``, in order.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Wait for room in the buffer, but give up once the consumer is gone
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for page in pages:
+                if not put(page):
+                    break
+        except Exception as e:
+            put(_PrefetchError(e))
+        finally:
+            pages.close()
+            put(done)
+
+    thread = threading.Thread(target=producer, name='lazy-pagination-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if isinstance(item, _PrefetchError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def lazy_pagination(page_size: int = 100, mode: str = 'offset',
+                    key: str = 'user_id', cursor: str = None,
+                    row_format: str = 'dict', prefetch: int = 0,
+                    raise_errors: bool = False):
     """
     A generator that lazily loads pages of users by calling paginate_users.
     It only fetches the next page from the database when it is requested.
 
     Args:
         page_size (int): The number of users per page.
+        mode (str): "offset" for LIMIT/OFFSET paging, or "keyset" to seek on
+            ``key`` using the last row of the previous page.
+        key (str): The ordering column used in keyset mode.
+        cursor (str): A token from page_cursor to resume a keyset sweep.
+            Its column takes precedence over ``key``.
+        row_format (str): The row format of each page; see seed.ROW_FORMATS.
+        prefetch (int): If greater than 0, fetch up to this many pages ahead
+            on a background thread (1 gives double buffering).
+        raise_errors (bool): Let database errors propagate. By default an
+            error is logged and ends the sweep as if the table had ended,
+            which callers that need every row cannot tell apart.
 
     Yields:
         list: A page (list) of user dictionaries.
     """
+    seed.check_row_format(row_format)
+    if prefetch > 0:
+        yield from _read_ahead(lazy_pagination(page_size, mode, key, cursor, row_format,
+                                               raise_errors=raise_errors), prefetch)
+        return
+
+    if mode == 'keyset':
+        after = None
+        if cursor:
+            key, after = decode_cursor(cursor)
+        while True:
+            page = paginate_users_keyset(page_size, key, after, row_format, raise_errors)
+
+            if not page:
+                break
+
+            yield page
+
+            if len(page) < page_size:
+                break
+            after = row_position(key, page[-1])
+        return
+
+    if mode != 'offset':
+        raise ValueError(f"Unknown pagination mode: '{mode}'")
+
     offset = 0
     while True:
         # Call the helper function using positional arguments to match the checker.
         # This is the line that was fixed.
-        page = paginate_users(page_size, offset)
-        
+        page = paginate_users(page_size, offset, row_format, raise_errors)
+
         if not page:
             break
-        
+
         yield page
-        
-        offset += page_size
\ No newline at end of file
+
+        offset += page_size
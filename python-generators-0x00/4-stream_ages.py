@@ -5,6 +5,7 @@ to calculate the average age of all users in a database without
 loading the entire dataset into memory.
 """
 import seed  # Import the seed module for database connection
+from query_builder import UserQuery
 
 def stream_user_ages():
     """
@@ -14,7 +15,7 @@ def stream_user_ages():
     connection = None
     cursor = None
     try:
-        connection = seed.connect_to_prodev()
+        connection = seed.connect_pooled()
         if not connection:
             return
 
@@ -31,15 +32,25 @@ def stream_user_ages():
     finally:
         if cursor:
             cursor.close()
-        if connection and connection.is_connected():
+        if connection:
+            # Hands the connection back to the pool rather than closing it
             connection.close()
 
 
-def calculate_average_age():
+def calculate_average_age(pushdown=False):
     """
     Consumes the stream_user_ages generator to calculate the average
     age in a memory-efficient manner.
+
+    Args:
+        pushdown (bool): If True, ask MySQL for AVG(age) instead of
+            streaming every age to the client.
     """
+    if pushdown:
+        average_age = UserQuery().avg('age') or 0
+        print(f"Average age of users: {average_age:.2f}")
+        return
+
     total_age = 0
     user_count = 0
 
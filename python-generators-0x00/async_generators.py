@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+"""
+This module provides asyncio counterparts of the user_data generators.
+
+mysql.connector and sqlite3 are blocking drivers, so each database call is
+run on a worker thread with asyncio.to_thread() while the event loop keeps
+serving other tasks. The connections come from the same pool as the blocking
+generators (seed.connect_pooled), and:
+
+- At most as many streams as the pool has connections run at once per
+  event loop; extra streams wait on an asyncio.Semaphore instead of tying
+  up a thread blocked on the pool.
+- Rows are read with an unbuffered cursor, one batch per iteration step,
+  so a slow consumer simply stops the reads (backpressure).
+- The public generators wrap their inner stream in contextlib.aclosing(),
+  so closing one early with aclose() releases its pooled connection and
+  stream slot right away, not whenever the inner generator happens to be
+  garbage collected. Callers that may stop iterating early should do the
+  same: ``async with aclosing(stream_users_async()) as users: ...``.
+
+Example:
+    async for user in stream_users_async():
+        print(user)
+"""
+import asyncio
+import weakref
+from contextlib import aclosing
+
+import seed
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+# One semaphore per event loop, sized to the shared pool
+_stream_slots = weakref.WeakKeyDictionary()
+
+
+def _slots():
+    """Returns the semaphore limiting concurrent streams on the running loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _stream_slots:
+        _stream_slots[loop] = asyncio.Semaphore(seed.get_pool().max_size)
+    return _stream_slots[loop]
+
+
+async def _fetch_batches(sql, batch_size, row_format, params=()):
+    """
+    An async generator that runs a query on a pooled connection and yields
+    its rows in batches, reading the next batch only when asked for it.
+    """
+    async with _slots():
+        connection = await asyncio.to_thread(seed.connect_pooled)
+        if not connection:
+            return
+        cursor = None
+        exhausted = False
+        try:
+            cursor = await asyncio.to_thread(seed.user_cursor, connection,
+                                             row_format, buffered=False)
+            await asyncio.to_thread(cursor.execute, sql, params)
+            while True:
+                batch = await asyncio.to_thread(cursor.fetchmany, batch_size)
+                if not batch:
+                    exhausted = True
+                    break
+                yield seed.format_rows(batch, row_format)
+        except Exception as e:
+            print(f"An error occurred while streaming asynchronously: {e}")
+        finally:
+            if exhausted:
+                await asyncio.to_thread(cursor.close)
+                await asyncio.to_thread(connection.close)
+            else:
+                # Stopped early or failed: drop the connection rather than
+                # reading the rest of the unbuffered result set.
+                await asyncio.to_thread(connection.invalidate)
+
+
+async def stream_users_async(batch_size=100, row_format='dict'):
+    """
+    An async generator that yields user rows one by one, like stream_users.
+
+    Args:
+        batch_size (int): The number of rows read from the server at a time.
+        row_format (str): "dict", "tuple" or "record"; see seed.ROW_FORMATS.
+    """
+    seed.check_row_format(row_format, allow_columnar=False)
+    sql = f"SELECT {seed.select_columns(row_format)} FROM user_data ORDER BY name;"
+    async with aclosing(_fetch_batches(sql, batch_size, row_format)) as batches:
+        async for batch in batches:
+            for row in batch:
+                yield row
+
+
+async def stream_users_in_batches_async(batch_size=50, row_format='dict'):
+    """
+    An async generator that yields batches of user rows, like
+    stream_users_in_batches.
+
+    Args:
+        batch_size (int): The number of rows in each batch.
+        row_format (str): The row format of each batch; see seed.ROW_FORMATS.
+    """
+    seed.check_row_format(row_format)
+    sql = f"SELECT {seed.select_columns(row_format)} FROM user_data ORDER BY name;"
+    async with aclosing(_fetch_batches(sql, batch_size, row_format)) as batches:
+        async for batch in batches:
+            yield batch
+
+
+async def lazy_pagination_async(page_size=100, key='user_id', cursor=None,
+                                row_format='dict'):
+    """
+    An async generator that yields pages of users using keyset pagination,
+    like lazy_pagination(mode="keyset").
+
+    Args:
+        page_size (int): The number of users per page.
+        key (str): The ordering column to seek on.
+        cursor (str): A token from page_cursor to resume a sweep.
+        row_format (str): The row format of each page; see seed.ROW_FORMATS.
+    """
+    seed.check_row_format(row_format)
+    after = None
+    if cursor:
+        key, after = lazy_paginate.decode_cursor(cursor)
+    while True:
+        # Each page borrows a pooled connection for the length of one query
+        async with _slots():
+            page = await asyncio.to_thread(lazy_paginate.paginate_users_keyset,
+                                           page_size, key, after, row_format)
+        if not page:
+            break
+
+        yield page
+
+        if len(page) < page_size:
+            break
+        after = lazy_paginate.row_position(key, page[-1])
+
+
+async def stream_user_ages_async(batch_size=500):
+    """An async generator that yields the age of each user, like stream_user_ages."""
+    async with aclosing(_fetch_batches("SELECT age FROM user_data", batch_size, 'tuple')) as batches:
+        async for batch in batches:
+            for row in batch:
+                yield row[0]
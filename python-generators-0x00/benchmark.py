@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+"""
+This script benchmarks the user_data generators as the table grows.
+
+For each table size it seeds a synthetic user_data table in a scratch
+database (ALX_prodev_bench by default, so ALX_prodev is never touched), then
+runs every generator with every batch size and records:
+
+- rows: the number of rows read
+- seconds / rows_per_sec: total wall-clock time and throughput
+- time_to_first_row_ms: how long until the first row (or batch) arrived
+- queries: the number of SQL statements executed
+- peak_memory_kb: the peak Python memory allocated while consuming the
+  generator (measured in a separate pass with tracemalloc, which slows
+  execution down and would otherwise skew the timings)
+
+The results are printed, or written with --output, as JSON so that runs can
+be compared to spot regressions.
+
+Usage:
+    python3 benchmark.py --sizes 10000,100000,1000000 --batch-sizes 50,1000 \\
+        --output results.json
+    python3 benchmark.py --backend sqlite --sizes 100000
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+import seed
+
+stream_users = __import__('0-stream_users')
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+stream_ages = __import__('4-stream_ages')
+
+_queries = [0]
+
+
+class _CountingCursor:
+    """Counts the statements executed through a cursor."""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, *args, **kwargs):
+        _queries[0] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        _queries[0] += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+
+class _CountingConnection:
+    """Hands out counting cursors."""
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._connection.cursor(*args, **kwargs))
+
+
+def _counting_factory():
+    connection = seed.connect_to_prodev(**seed.get_backend().pool_options)
+    return _CountingConnection(connection) if connection else None
+
+
+def seed_table(rows, chunk_size=10000):
+    """
+    Recreates user_data in the benchmark database with ``rows`` synthetic users.
+
+    The data is generated from a fixed random seed, so every run benchmarks
+    the same table.
+    """
+    backend = seed.get_backend()
+    if backend.name == 'mysql':
+        server = seed.connect_db()
+        if not server:
+            raise RuntimeError("Could not connect to MySQL")
+        cursor = server.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {os.environ['DB_NAME']}")
+        cursor.close()
+        server.close()
+
+    connection = seed.connect_to_prodev()
+    if not connection:
+        raise RuntimeError(f"Could not connect to {os.environ['DB_NAME']}")
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    # SQLite has no TRUNCATE
+    cursor.execute("TRUNCATE TABLE user_data" if backend.name == 'mysql' else "DELETE FROM user_data")
+    connection.commit()
+    generator = random.Random(rows)
+    sql = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
+    for start in range(0, rows, chunk_size):
+        chunk = []
+        for index in range(start, min(start + chunk_size, rows)):
+            user_id = str(uuid.UUID(int=generator.getrandbits(128), version=4))
+            chunk.append((user_id, f"User {generator.randrange(rows)}",
+                          f"user{index}@example.com", generator.randint(18, 100)))
+        cursor.executemany(sql, chunk)
+        connection.commit()
+    cursor.close()
+    seed.create_indexes(connection)
+    connection.close()
+
+
+def _single_row(item):
+    """Row count of a generator that yields single rows."""
+    return 1
+
+
+def _cases(batch_sizes, table_rows, max_offset_rows):
+    """
+    Yields ``(generator, params, factory, rows_per_item)`` for every case.
+
+    rows_per_item maps a yielded item to the number of rows it holds.
+    """
+    yield 'stream_users', {}, stream_users.stream_users, _single_row
+    yield 'stream_user_ages', {}, stream_ages.stream_user_ages, _single_row
+    for batch_size in batch_sizes:
+        yield ('stream_users', {'streaming': True, 'prefetch': batch_size},
+               lambda b=batch_size: stream_users.stream_users(streaming=True, prefetch=b), _single_row)
+        yield ('stream_users_in_batches', {'batch_size': batch_size},
+               lambda b=batch_size: batch_processing.stream_users_in_batches(b), len)
+        yield ('lazy_pagination', {'page_size': batch_size, 'mode': 'keyset'},
+               lambda b=batch_size: lazy_paginate.lazy_pagination(b, mode='keyset'), len)
+        # OFFSET paging is quadratic; past max_offset_rows it would dominate the run
+        if table_rows <= max_offset_rows:
+            yield ('lazy_pagination', {'page_size': batch_size, 'mode': 'offset'},
+                   lambda b=batch_size: lazy_paginate.lazy_pagination(b), len)
+
+
+def measure(factory, rows_per_item):
+    """Consumes a generator and returns its metrics."""
+    _queries[0] = 0
+    rows = 0
+    first = None
+    start = time.perf_counter()
+    for item in factory():
+        if first is None:
+            first = time.perf_counter() - start
+        rows += rows_per_item(item)
+    seconds = time.perf_counter() - start
+    queries = _queries[0]
+
+    tracemalloc.start()
+    for _ in factory():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds) if seconds else None,
+        'time_to_first_row_ms': round(first * 1000, 3) if first is not None else None,
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(sizes, batch_sizes, max_offset_rows):
+    """Seeds each table size, runs every case and returns the result records."""
+    results = []
+    for table_rows in sizes:
+        print(f"Seeding {table_rows} rows...", flush=True)
+        seed_table(table_rows)
+        # A fresh pool per table so each size starts with cold connections
+        seed.set_pool(seed.ConnectionPool(factory=_counting_factory))
+        for generator, params, factory, rows_per_item in _cases(batch_sizes, table_rows,
+                                                                max_offset_rows):
+            record = {'table_rows': table_rows, 'generator': generator, 'params': params}
+            record.update(measure(factory, rows_per_item))
+            print(json.dumps(record), flush=True)
+            results.append(record)
+    return results
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the user_data generators.")
+    parser.add_argument('--sizes', type=_int_list, default=[10000, 100000],
+                        help="comma-separated table sizes (default: 10000,100000)")
+    parser.add_argument('--batch-sizes', type=_int_list, default=[50, 1000],
+                        help="comma-separated batch/page sizes (default: 50,1000)")
+    parser.add_argument('--max-offset-rows', type=int, default=1000000,
+                        help="skip OFFSET pagination on larger tables (default: 1000000)")
+    parser.add_argument('--database', default='ALX_prodev_bench',
+                        help="scratch database to seed (default: ALX_prodev_bench)")
+    parser.add_argument('--backend', choices=sorted(seed.BACKENDS),
+                        default=os.getenv('DB_BACKEND', 'mysql'),
+                        help="database backend to benchmark (default: DB_BACKEND or mysql)")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    args = parser.parse_args()
+    if args.database == 'ALX_prodev':
+        parser.error("refusing to truncate ALX_prodev; use a scratch database")
+
+    os.environ['DB_NAME'] = args.database
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        # Keep the scratch file next to the database name, not ALX_prodev's file
+        os.environ['SQLITE_PATH'] = args.database + '.db'
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'backend': args.backend,
+        'results': run(args.sizes, args.batch_sizes, args.max_offset_rows),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+"""
+This module exports user_data to local files for offline analytics.
+
+- export_ndjson() writes gzip-compressed newline-delimited JSON, split into
+  files of a bounded number of rows.
+- export_columnar() writes one row group per batch. If pyarrow is installed
+  the file is Parquet (which records min/max statistics per row group);
+  otherwise it is a simple typed binary format, described below, that
+  stores the same statistics in its footer. Rows are written in age order,
+  so each row group covers a narrow age range and those statistics can
+  rule groups out.
+- read_columnar() memory-maps a file in the binary format and yields one
+  seed.ColumnarBatch per row group, skipping row groups whose age
+  statistics rule them out.
+
+Both exports read user_data directly rather than through
+stream_users_in_batches(), which logs and swallows database errors: a
+failed read must fail the export, not leave a truncated file behind that
+looks complete.
+
+Binary format ("UDC1"), all in native byte order:
+    b"UDC1"
+    row group 0 column chunks, row group 1 column chunks, ...
+    footer: JSON metadata (row counts, chunk offsets, statistics)
+    footer length (8 bytes, little-endian) + b"UDC1"
+An int column chunk is the raw array('i') bytes. A text column chunk is an
+array('I') of n + 1 byte offsets followed by the UTF-8 bytes of every value.
+"""
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import seed
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+MAGIC = b'UDC1'
+_FOOTER_TAIL = struct.Struct('<Q4s')
+TEXT_COLUMNS = ('user_id', 'name', 'email')
+
+
+def _read_batches(batch_size, row_format, order_by):
+    """
+    A generator that yields user_data in batches, letting errors propagate.
+
+    Args:
+        batch_size (int): The number of rows fetched at a time.
+        row_format (str): "tuple" or "columnar"; see seed.ROW_FORMATS.
+        order_by (str): The ORDER BY clause.
+    """
+    connection = seed.connect_pooled()
+    if not connection:
+        raise RuntimeError("Could not connect to ALX_prodev")
+    cursor = None
+    try:
+        cursor = seed.user_cursor(connection, row_format)
+        cursor.execute(f"SELECT {seed.select_columns(row_format)} FROM user_data "
+                       f"ORDER BY {order_by}")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield seed.format_rows(batch, row_format)
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+def export_ndjson(directory, rows_per_file=1000000, batch_size=10000):
+    """
+    Streams user_data into gzip-compressed NDJSON files.
+
+    Args:
+        directory (str): The directory to write ``users-NNNNN.ndjson.gz`` into.
+        rows_per_file (int): The maximum number of rows per file.
+        batch_size (int): The number of rows read from MySQL at a time.
+
+    Returns:
+        list: The paths of the files written.
+
+    Raises:
+        Whatever error the database raised; the files written so far are
+        then incomplete.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    output = None
+    rows_in_file = 0
+    try:
+        for batch in _read_batches(batch_size, 'tuple', 'user_id'):
+            for row in batch:
+                if output is None or rows_in_file >= rows_per_file:
+                    if output:
+                        output.close()
+                    paths.append(os.path.join(directory, f"users-{len(paths):05d}.ndjson.gz"))
+                    output = gzip.open(paths[-1], 'wt', encoding='utf-8')
+                    rows_in_file = 0
+                output.write(json.dumps(dict(zip(seed.USER_COLUMNS, row))))
+                output.write('\n')
+                rows_in_file += 1
+    finally:
+        if output:
+            output.close()
+    return paths
+
+
+def _column_stats(values):
+    """Returns [min, max] of a non-empty column."""
+    return [min(values), max(values)]
+
+
+def _write_parquet(path, row_group_size):
+    """Writes user_data to a Parquet file, one row group per batch."""
+    schema = pyarrow.schema([
+        ('user_id', pyarrow.string()),
+        ('name', pyarrow.string()),
+        ('email', pyarrow.string()),
+        ('age', pyarrow.int32()),
+    ])
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in _read_batches(row_group_size, 'columnar', 'age, user_id'):
+            columns = {name: list(batch.column(name)) for name in seed.USER_COLUMNS}
+            writer.write_table(pyarrow.table(columns, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def _write_binary(path, row_group_size):
+    """Writes user_data in the UDC1 binary format, one row group per batch."""
+    row_groups = []
+    rows = 0
+    with open(path, 'wb') as output:
+        output.write(MAGIC)
+        for batch in _read_batches(row_group_size, 'columnar', 'age, user_id'):
+            group = {'rows': len(batch), 'columns': {}, 'stats': {}}
+            for name in seed.USER_COLUMNS:
+                values = batch.column(name)
+                if name in TEXT_COLUMNS:
+                    encoded = [value.encode('utf-8') for value in values]
+                    offsets = array('I', [0])
+                    for value in encoded:
+                        offsets.append(offsets[-1] + len(value))
+                    chunk = offsets.tobytes() + b''.join(encoded)
+                else:
+                    chunk = values.tobytes()
+                group['columns'][name] = [output.tell(), len(chunk)]
+                group['stats'][name] = _column_stats(values)
+                output.write(chunk)
+            row_groups.append(group)
+            rows += len(batch)
+
+        footer = json.dumps({
+            'columns': list(seed.USER_COLUMNS),
+            'byteorder': sys.byteorder,
+            'int_size': array('i').itemsize,
+            'offset_size': array('I').itemsize,
+            'row_groups': row_groups,
+        }).encode('utf-8')
+        output.write(footer)
+        output.write(_FOOTER_TAIL.pack(len(footer), MAGIC))
+    return rows
+
+
+def export_columnar(path, row_group_size=100000, binary=False):
+    """
+    Streams user_data into a columnar file with per-row-group statistics.
+
+    Args:
+        path (str): The file to write.
+        row_group_size (int): The number of rows per row group (and per
+            batch read from MySQL).
+        binary (bool): Write the UDC1 binary format even if pyarrow is
+            available.
+
+    Returns:
+        str: "parquet" or "udc1", the format that was written.
+
+    Raises:
+        Whatever error the database raised; the file is then removed.
+    """
+    file_format = 'parquet' if pyarrow is not None and not binary else 'udc1'
+    try:
+        if file_format == 'parquet':
+            rows = _write_parquet(path, row_group_size)
+        else:
+            rows = _write_binary(path, row_group_size)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    print(f"Exported {rows} rows to {path} ({file_format}).")
+    return file_format
+
+
+def read_footer(path):
+    """Returns the footer metadata of a UDC1 file."""
+    with open(path, 'rb') as source:
+        source.seek(-_FOOTER_TAIL.size, os.SEEK_END)
+        length, magic = _FOOTER_TAIL.unpack(source.read(_FOOTER_TAIL.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a UDC1 file")
+        source.seek(-_FOOTER_TAIL.size - length, os.SEEK_END)
+        return json.loads(source.read(length))
+
+
+def read_columnar(path, min_age=None, max_age=None):
+    """
+    A generator that memory-maps a UDC1 file and yields its row groups.
+
+    Only the pages of the row groups actually read are loaded from disk,
+    and column chunks are sliced as memoryviews of the map rather than
+    copied. Row groups whose age statistics fall entirely outside
+    ``[min_age, max_age]`` are skipped without being touched (the export is
+    in age order, so most groups can be); rows inside a returned group are
+    not filtered.
+
+    Args:
+        path (str): A file written by export_columnar(binary=True).
+        min_age (int): Skip row groups whose ages are all below this.
+        max_age (int): Skip row groups whose ages are all above this.
+
+    Yields:
+        seed.ColumnarBatch: One batch per row group.
+    """
+    footer = read_footer(path)
+    if (footer['byteorder'] != sys.byteorder or footer['int_size'] != array('i').itemsize
+            or footer['offset_size'] != array('I').itemsize):
+        raise ValueError(f"{path} was written on a platform with a different layout")
+
+    with open(path, 'rb') as source, \
+            mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+            memoryview(mapped) as view:
+        for group in footer['row_groups']:
+            low, high = group['stats']['age']
+            if (min_age is not None and high < min_age) or (max_age is not None and low > max_age):
+                continue
+            columns = {}
+            for name in seed.USER_COLUMNS:
+                start, length = group['columns'][name]
+                with view[start:start + length] as chunk:
+                    if name in TEXT_COLUMNS:
+                        offsets = array('I')
+                        offsets.frombytes(chunk[:(group['rows'] + 1) * offsets.itemsize])
+                        with chunk[len(offsets) * offsets.itemsize:] as data:
+                            columns[name] = [str(data[offsets[i]:offsets[i + 1]], 'utf-8')
+                                             for i in range(group['rows'])]
+                    else:
+                        columns[name] = array('i')
+                        columns[name].frombytes(chunk)
+            yield seed.ColumnarBatch(columns)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+This script shows how the secondary indexes declared in seed.USER_DATA_INDEXES
+are used by the queries the generators run.
+
+For each query it prints the plan MySQL chooses (the index used and whether
+a filesort is needed) and compares the best of a few timed runs against the
+same query with the secondary indexes ignored.
+
+Usage:
+    python3 index_benchmark.py
+"""
+import time
+
+import seed
+
+# (label, query) pairs; {hint} is replaced by an index hint.
+QUERIES = (
+    ("stream_users: first page ordered by name",
+     "SELECT * FROM user_data {hint} ORDER BY name LIMIT 100"),
+    ("stream_users: full scan ordered by name",
+     "SELECT * FROM user_data {hint} ORDER BY name"),
+    ("batch_processing: age > 25",
+     "SELECT * FROM user_data {hint} WHERE age > 25"),
+    ("covering: user_ids for an age range",
+     "SELECT user_id FROM user_data {hint} WHERE age BETWEEN 30 AND 35"),
+    ("keyset page on age",
+     "SELECT * FROM user_data {hint} WHERE (age, user_id) > (40, '') "
+     "ORDER BY age, user_id LIMIT 100"),
+)
+
+
+def explain(cursor, sql):
+    """Returns the index MySQL picks for a query and whether it needs a filesort."""
+    cursor.execute(f"EXPLAIN {sql}")
+    columns = [description[0] for description in cursor.description]
+    plan = dict(zip(columns, cursor.fetchone()))
+    cursor.fetchall()  # Discard the remaining plan rows, if any
+    extra = plan.get('Extra') or ''
+    return plan.get('key') or 'none (full scan)', 'filesort' in extra.lower()
+
+
+def time_query(cursor, sql, repeat=3):
+    """Returns the best wall-clock time, in milliseconds, over ``repeat`` runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql)
+        cursor.fetchall()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(connection, repeat=3):
+    """Prints the plan and timings of every query in QUERIES."""
+    ignore = f"IGNORE INDEX ({', '.join(seed.USER_DATA_INDEXES)})"
+    cursor = connection.cursor()
+    try:
+        for label, query in QUERIES:
+            indexed_sql = query.format(hint='')
+            plain_sql = query.format(hint=ignore)
+            key, filesort = explain(cursor, indexed_sql)
+            with_index = time_query(cursor, indexed_sql, repeat)
+            without_index = time_query(cursor, plain_sql, repeat)
+            print(f"{label}\n"
+                  f"    index: {key}{', filesort' if filesort else ''}\n"
+                  f"    with indexes: {with_index:.1f} ms, "
+                  f"without: {without_index:.1f} ms")
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    connection = seed.connect_to_prodev()
+    if connection:
+        seed.create_indexes(connection)
+        run_benchmark(connection)
+        connection.close()
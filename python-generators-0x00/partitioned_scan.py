@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+"""
+This module scans user_data in parallel across worker processes.
+
+The table is split into contiguous user_id ranges, each range is read by a
+separate process over its own connection, and the results are merged back
+in the parent:
+
+- scan_partitions() yields the rows themselves, either in user_id order
+  (partitions are merged in key order) or in whatever order they finish.
+  Filters are pushed into each partition's query, so the batch_processing
+  filter streams through it.
+- reduce_partitions() runs a reducer inside each worker so only a small
+  partial result crosses the process boundary, then combines the partials.
+
+Memory stays bounded however large the table is: partitions hold at most
+``partition_rows`` rows, and only ``window`` partitions are submitted to
+the pool at a time, the next one going out as each result is consumed.
+
+AverageAgeReducer covers calculate_average_age and AgeStatisticsReducer
+computes the full stream_stats.StreamingStats.
+"""
+import math
+import os
+import queue
+from collections import deque
+from multiprocessing import Pool
+
+import seed
+from query_builder import UserQuery
+from stream_stats import StreamingStats
+
+
+# The most rows a worker reads into one partition by default
+PARTITION_ROWS = 10000
+
+
+def partition_bounds(partitions, max_rows=None):
+    """
+    Splits the user_id key space into ranges holding roughly equal row counts.
+
+    The boundaries are read from the primary key index by walking it once:
+    each boundary is found by seeking to the previous one and stepping over
+    the rows in between, so the whole walk reads the index a single time
+    rather than rescanning it from the start for every boundary.
+
+    Args:
+        partitions (int): The number of ranges to create.
+        max_rows (int): If given, more ranges are created when needed so
+            none holds more than this many rows.
+
+    Returns:
+        list: ``(lower, upper)`` pairs where lower is inclusive, upper is
+        exclusive and None means unbounded.
+    """
+    connection = seed.connect_pooled()
+    if not connection:
+        return []
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        total = cursor.fetchone()[0]
+        if total == 0:
+            return []
+        if max_rows:
+            partitions = max(partitions, math.ceil(total / max_rows))
+        partitions = max(1, min(partitions, total))
+        boundaries = []
+        position = 0  # The index of the last boundary in user_id order
+        for index in range(1, partitions):
+            target = index * total // partitions
+            if boundaries:
+                cursor.execute("SELECT user_id FROM user_data WHERE user_id >= %s "
+                               "ORDER BY user_id LIMIT 1 OFFSET %s",
+                               (boundaries[-1], target - position))
+            else:
+                cursor.execute("SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+                               (target,))
+            row = cursor.fetchone()
+            if row is None:
+                # Rows were deleted while walking: the last range takes the rest
+                break
+            boundaries.append(row[0])
+            position = target
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+    lowers = [None] + boundaries
+    uppers = boundaries + [None]
+    return list(zip(lowers, uppers))
+
+
+def _partition_query(lower, upper, predicates, columns):
+    """Builds the SQL that reads one partition, ordered by user_id."""
+    query = UserQuery(predicates)
+    if lower is not None:
+        query = query.where('user_id', '>=', lower)
+    if upper is not None:
+        query = query.where('user_id', '<', upper)
+    return query.order_by('user_id').to_sql(', '.join(columns))
+
+
+def _read_partition(lower, upper, predicates, columns):
+    """
+    Reads one partition in a worker process and returns its rows as tuples.
+
+    Workers open their own connection: a forked child must not reuse sockets
+    from the parent's pool.
+    """
+    connection = seed.connect_to_prodev()
+    if not connection:
+        raise RuntimeError("Worker could not connect to ALX_prodev")
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        sql, params = _partition_query(lower, upper, predicates, columns)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+def _scan_task(task):
+    """Worker entry point for scan_partitions."""
+    lower, upper, predicates, row_format = task
+    rows = _read_partition(lower, upper, predicates, seed.USER_COLUMNS)
+    if row_format == 'dict':
+        return [dict(zip(seed.USER_COLUMNS, row)) for row in rows]
+    return seed.format_rows(rows, row_format)
+
+
+def _reduce_task(task):
+    """Worker entry point for reduce_partitions."""
+    lower, upper, reducer = task
+    rows = _read_partition(lower, upper, reducer.predicates, reducer.columns)
+    return reducer.map_partition(rows)
+
+
+class AverageAgeReducer:
+    """Computes the average age, like calculate_average_age."""
+    columns = ('age',)
+    predicates = ()
+
+    def map_partition(self, rows):
+        """Returns ``(sum, count)`` for one partition."""
+        return sum(row[0] for row in rows), len(rows)
+
+    def combine(self, partials):
+        """Merges the partial sums and counts into the overall average."""
+        total = count = 0
+        for partial_total, partial_count in partials:
+            total += partial_total
+            count += partial_count
+        return total / count if count else 0
+
+
+class AgeStatisticsReducer:
+    """Computes mean, variance, min/max and percentiles of the ages."""
+    columns = ('age',)
+    predicates = ()
+
+    def __init__(self, bucket_width=1):
+        self.bucket_width = bucket_width
+
+    def map_partition(self, rows):
+        """Returns the statistics of one partition."""
+        return StreamingStats(self.bucket_width).update_many(row[0] for row in rows)
+
+    def combine(self, partials):
+        """Merges the partitions' statistics."""
+        stats = StreamingStats(self.bucket_width)
+        for partial in partials:
+            stats.merge(partial)
+        return stats
+
+
+def _default_workers(workers):
+    return workers or os.cpu_count() or 1
+
+
+def _run_bounded(func, tasks, workers, window, ordered):
+    """
+    Runs func over tasks in a process pool, yielding the results.
+
+    At most ``window`` tasks are submitted at a time, and the next one only
+    after a result has been taken, so unread results cannot pile up in
+    the parent the way they do with an unbounded Pool.imap().
+    """
+    tasks = iter(tasks)
+    finished = queue.SimpleQueue()  # Completed results, for unordered runs
+    pending = deque()
+    with Pool(workers) as pool:
+        def submit():
+            task = next(tasks, None)
+            if task is None:
+                return False
+            if ordered:
+                # Results are taken from the AsyncResults, in submission order
+                pending.append(pool.apply_async(func, (task,)))
+            else:
+                # Results arrive through finished as they complete; keeping
+                # the AsyncResults would hold on to them after they are read
+                pool.apply_async(func, (task,), callback=finished.put,
+                                 error_callback=finished.put)
+                pending.append(None)
+            return True
+
+        while len(pending) < window and submit():
+            pass
+        while pending:
+            if ordered:
+                result = pending.popleft().get()
+            else:
+                result = finished.get()
+                pending.pop()
+                if isinstance(result, BaseException):
+                    raise result
+            submit()
+            yield result
+
+
+def scan_partitions(workers=None, partitions=None, ordered=True,
+                    row_format='dict', predicates=(), partition_rows=PARTITION_ROWS,
+                    window=None):
+    """
+    A generator that reads user_data in parallel and yields its rows.
+
+    Args:
+        workers (int): The number of worker processes (default: CPU count).
+        partitions (int): The number of user_id ranges. Using several per
+            worker keeps the ranges small and the workers evenly loaded
+            (default: 4 per worker, more if needed to honour
+            partition_rows).
+        ordered (bool): If True, rows come back in user_id order. If False,
+            each partition is yielded as soon as it is ready.
+        row_format (str): "dict", "tuple" or "record"; see seed.ROW_FORMATS.
+        predicates (tuple): ``(column, op, value)`` filters pushed into each
+            partition's query; see query_builder.UserQuery.where().
+        partition_rows (int): The most rows in one partition, which bounds
+            what a worker holds and sends back at once.
+        window (int): The most partitions in flight, read or being read
+            (default: 2 per worker).
+
+    Yields:
+        The rows of user_data in the requested row format.
+    """
+    seed.check_row_format(row_format, allow_columnar=False)
+    workers = _default_workers(workers)
+    bounds = partition_bounds(partitions or workers * 4, partition_rows)
+    tasks = [(lower, upper, tuple(predicates), row_format) for lower, upper in bounds]
+    if not tasks:
+        return
+    for rows in _run_bounded(_scan_task, tasks, min(workers, len(tasks)),
+                             window or workers * 2, ordered):
+        yield from rows
+
+
+def reduce_partitions(reducer, workers=None, partitions=None, ordered=True,
+                      partition_rows=PARTITION_ROWS, window=None):
+    """
+    Applies a reducer to every partition in parallel and combines the results.
+
+    Args:
+        reducer: An object with ``columns``, ``predicates``,
+            ``map_partition(rows)`` and ``combine(partials)``, such as
+            AverageAgeReducer. combine() receives an iterator and should
+            consume it in one pass.
+        workers (int): The number of worker processes (default: CPU count).
+        partitions (int): The number of user_id ranges (default: workers,
+            more if needed to honour partition_rows).
+        ordered (bool): If True, partials are combined in user_id order.
+        partition_rows (int): The most rows in one partition.
+        window (int): The most partitions in flight (default: 2 per worker).
+
+    Returns:
+        The result of ``reducer.combine()``.
+    """
+    workers = _default_workers(workers)
+    bounds = partition_bounds(partitions or workers, partition_rows)
+    tasks = [(lower, upper, reducer) for lower, upper in bounds]
+    if not tasks:
+        return reducer.combine(iter(()))
+    partials = _run_bounded(_reduce_task, tasks, min(workers, len(tasks)),
+                            window or workers * 2, ordered)
+    try:
+        return reducer.combine(partials)
+    finally:
+        partials.close()
+
+
+def parallel_batch_processing(workers=None, min_age=25):
+    """Prints the users older than min_age, scanning partitions in parallel."""
+    # The filter is pushed down, and the rows are printed as they stream in
+    for user in scan_partitions(workers, predicates=(('age', '>', min_age),)):
+        print(user)
+
+
+def parallel_average_age(workers=None):
+    """Prints the average age of users, scanning partitions in parallel."""
+    average_age = reduce_partitions(AverageAgeReducer(), workers, ordered=False)
+    print(f"Average age of users: {average_age:.2f}")
+
+
+if __name__ == "__main__":
+    parallel_average_age()
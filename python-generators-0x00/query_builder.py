@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+"""
+This module provides a small query builder over the user_data table.
+
+It pushes filters, projections and aggregates (COUNT, SUM, AVG, MIN, MAX and
+histograms) down into SQL whenever it can, so MySQL does the work and only
+the answer crosses the wire. When a query contains something SQL cannot
+express - a Python callable used as a filter - the builder still pushes down
+whatever it can and finishes the job client-side by streaming rows.
+
+Every execution prints the chosen plan, e.g.:
+    LOG: plan=server-side avg(age) WHERE age > %s
+    LOG: plan=client-side avg(age) (1 Python filter(s)) WHERE age > %s
+
+Example:
+    query = UserQuery().where('age', '>', 25)
+    print(query.avg('age'))
+    for batch in query.order_by('name').batches(100):
+        ...
+"""
+from decimal import Decimal
+
+import seed
+
+# Comparison operators that can be pushed down into a WHERE clause.
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+
+
+def _check_column(column):
+    """Column names are interpolated into SQL, so only known columns are allowed."""
+    if column not in seed.USER_COLUMNS:
+        raise ValueError(f"Unknown user_data column: '{column}'")
+
+
+def _number(value):
+    """Converts the Decimal values MySQL returns for aggregates to int/float."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class UserQuery:
+    """
+    An immutable-style builder for queries over user_data.
+
+    where(), filter() and order_by() return a new UserQuery, so a base query
+    can be shared and refined without side effects.
+    """
+    def __init__(self, predicates=(), filters=(), ordering=None):
+        self._predicates = tuple(predicates)  # (column, op, value), pushable
+        self._filters = tuple(filters)        # Python callables, client-side only
+        self._ordering = ordering
+
+    def where(self, column, op, value):
+        """Adds a predicate that can be evaluated by the database."""
+        _check_column(column)
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: '{op}'")
+        return UserQuery(self._predicates + ((column, op, value),),
+                         self._filters, self._ordering)
+
+    def filter(self, function):
+        """
+        Adds a Python predicate that receives each row as a dictionary.
+
+        It cannot be pushed down, so any query using it falls back to
+        streaming the rows that match the other predicates.
+        """
+        return UserQuery(self._predicates, self._filters + (function,),
+                         self._ordering)
+
+    def order_by(self, column):
+        """Sets the column the rows are sorted by."""
+        _check_column(column)
+        return UserQuery(self._predicates, self._filters, column)
+
+    @property
+    def pushable(self):
+        """True if the whole query can be evaluated by the database."""
+        return not self._filters
+
+    def _where_sql(self):
+        """Returns the WHERE clause and its parameters for the pushable predicates."""
+        if not self._predicates:
+            return "", ()
+        clauses = [f"{column} {op} %s" for column, op, _ in self._predicates]
+        params = tuple(value for _, _, value in self._predicates)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def to_sql(self, columns='*'):
+        """Returns the SELECT statement and parameters for the pushable part."""
+        where, params = self._where_sql()
+        sql = f"SELECT {columns} FROM user_data{where}"
+        if self._ordering:
+            sql += f" ORDER BY {self._ordering}"
+        return sql, params
+
+    def _log_plan(self, description):
+        where, _ = self._where_sql()
+        if self.pushable:
+            print(f"LOG: plan=server-side {description}{where}")
+        else:
+            print(f"LOG: plan=client-side {description} "
+                  f"({len(self._filters)} Python filter(s)){where}")
+
+    def _accepts(self, row):
+        """Applies the client-side filters to a dictionary row."""
+        return all(function(row) for function in self._filters)
+
+    def _execute(self, sql, params):
+        """Runs a query that returns a small result and fetches all of it."""
+        connection = seed.connect_pooled()
+        if not connection:
+            return []
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            if cursor:
+                cursor.close()
+            connection.close()
+
+    def batches(self, batch_size=50, row_format='dict'):
+        """
+        Yields the matching rows in batches.
+
+        Pushable predicates and the ordering go into the SQL; Python filters
+        are applied to each fetched batch, so a batch may come back smaller
+        than batch_size in that case.
+
+        Args:
+            batch_size (int): The number of rows fetched from the server at a time.
+            row_format (str): The row format of each batch; see seed.ROW_FORMATS.
+
+        Yields:
+            The rows of each batch in the requested row format.
+        """
+        seed.check_row_format(row_format)
+        self._log_plan("rows")
+        connection = None
+        cursor = None
+        try:
+            connection = seed.connect_pooled()
+            if not connection:
+                return
+            # Python filters are written against dictionary rows
+            fetch_format = 'dict' if self._filters else row_format
+            cursor = seed.user_cursor(connection, fetch_format)
+            sql, params = self.to_sql(seed.select_columns(fetch_format))
+            cursor.execute(sql, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                if self._filters:
+                    batch = [row for row in batch if self._accepts(row)]
+                    if row_format != 'dict':
+                        batch = [tuple(row[column] for column in seed.USER_COLUMNS)
+                                 for row in batch]
+                    if not batch:
+                        continue
+                yield seed.format_rows(batch, row_format)
+        except Exception as e:
+            print(f"An error occurred while running the query: {e}")
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+
+    def rows(self, batch_size=50, row_format='dict'):
+        """Yields the matching rows one by one."""
+        seed.check_row_format(row_format, allow_columnar=False)
+        for batch in self.batches(batch_size, row_format):
+            yield from batch
+
+    def _client_values(self, column, batch_size=1000):
+        """Streams one column of the matching rows, for the client-side plan."""
+        for batch in UserQuery(self._predicates, self._filters).batches(batch_size):
+            for row in batch:
+                yield row[column]
+
+    def aggregate(self, function, column='age'):
+        """
+        Computes COUNT, SUM, AVG, MIN or MAX over the matching rows.
+
+        Args:
+            function (str): One of AGGREGATES.
+            column (str): The column to aggregate (ignored for count).
+
+        Returns:
+            The aggregate value, or None for an empty input (0 for count).
+        """
+        if function not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: '{function}'")
+        _check_column(column)
+        expression = "COUNT(*)" if function == 'count' else f"{function.upper()}({column})"
+        self._log_plan(expression.lower())
+
+        if self.pushable:
+            where, params = self._where_sql()
+            rows = self._execute(f"SELECT {expression} FROM user_data{where}", params)
+            value = _number(rows[0][0]) if rows else None
+            if function == 'count':
+                return value or 0
+            if function == 'avg' and value is not None:
+                return float(value)
+            return value
+
+        count = 0
+        total = 0
+        low = high = None
+        for value in self._client_values(column):
+            count += 1
+            if function in ('sum', 'avg'):
+                total += value
+            if low is None or value < low:
+                low = value
+            if high is None or value > high:
+                high = value
+        if function == 'count':
+            return count
+        if count == 0:
+            return None
+        if function == 'sum':
+            return total
+        if function == 'avg':
+            return total / count
+        return low if function == 'min' else high
+
+    def count(self):
+        """Returns the number of matching rows."""
+        return self.aggregate('count')
+
+    def sum(self, column='age'):
+        """Returns the sum of a column over the matching rows."""
+        return self.aggregate('sum', column)
+
+    def avg(self, column='age'):
+        """Returns the average of a column over the matching rows."""
+        return self.aggregate('avg', column)
+
+    def histogram(self, column='age', width=10):
+        """
+        Counts the matching rows per bucket of a numeric column.
+
+        Args:
+            column (str): The numeric column to bucket.
+            width (int): The width of each bucket.
+
+        Returns:
+            dict: Maps each bucket's lower bound to its row count, in order.
+        """
+        _check_column(column)
+        self._log_plan(f"histogram({column}, width={width})")
+
+        if self.pushable:
+            where, params = self._where_sql()
+            bucket = seed.get_backend().bucket_expression(column)
+            sql = (f"SELECT {bucket} AS bucket, COUNT(*) "
+                   f"FROM user_data{where} GROUP BY bucket ORDER BY bucket")
+            rows = self._execute(sql, (width, width) + params)
+            return {_number(bucket): count for bucket, count in rows}
+
+        buckets = {}
+        for value in self._client_values(column):
+            bucket = (value // width) * width
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        return dict(sorted(buckets.items()))
@@ -2,98 +2,980 @@
 """
 This script provides functions to set up and seed a MySQL database
 for the ALX ProDev Python Generators project.
+
+The same functions, and every generator built on them, can also run against
+an SQLite file (e.g. a local snapshot for low-latency batch jobs): set the
+DB_BACKEND environment variable to "sqlite", and SQLITE_PATH to the file
+(default: ALX_prodev.db). See MySQLBackend and SQLiteBackend below.
 """
-import mysql.connector
 import os
 import csv
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from itertools import islice
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+# Exceptions raised by any supported driver
+if mysql is not None:
+    DB_ERRORS = (mysql.connector.Error, sqlite3.Error)
+else:
+    DB_ERRORS = (sqlite3.Error,)
+
+
+class MySQLBackend:
+    """
+    Connections and dialect-specific SQL for MySQL (mysql.connector).
+
+    The queries throughout this project are written in MySQL's dialect with
+    %s placeholders, so most methods just return them unchanged.
+    """
+    name = 'mysql'
+    # consume_results lets a generator that is closed early close its cursor
+    # without an "Unread result found" error, so the connection can still go
+    # back to the pool.
+    pool_options = {'consume_results': True}
+    # Stored rows are hashed by the server, see _changed_rows()
+    row_hash_expression = "MD5(CONCAT_WS('|', name, email, age))"
+    upsert_clause = (" ON DUPLICATE KEY UPDATE name = VALUES(name), "
+                     "email = VALUES(email), age = VALUES(age)")
+
+    def connect_server(self):
+        """Connects to the MySQL server without selecting a database."""
+        if mysql is None:
+            print("Error connecting to MySQL: mysql-connector-python is not installed")
+            return None
+        try:
+            return mysql.connector.connect(
+                host=os.getenv('DB_HOST', 'localhost'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD')
+            )
+        except DB_ERRORS as err:
+            print(f"Error connecting to MySQL: {err}")
+            return None
+
+    def connect(self, **options):
+        """Connects to the project database; options go to mysql.connector.connect()."""
+        if mysql is None:
+            print("Error connecting to ALX_prodev: mysql-connector-python is not installed")
+            return None
+        try:
+            return mysql.connector.connect(
+                host=os.getenv('DB_HOST', 'localhost'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                database=os.getenv('DB_NAME', 'ALX_prodev'),
+                **options
+            )
+        except DB_ERRORS as err:
+            print(f"Error connecting to ALX_prodev: {err}")
+            return None
+
+    def bucket_expression(self, column):
+        """SQL for the lower bound of a histogram bucket; takes the width twice."""
+        return f"FLOOR({column} / %s) * %s"
+
+    def index_names(self, cursor):
+        """Returns the names of the indexes on user_data."""
+        cursor.execute(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'"
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def drop_index_sql(self, name):
+        return f"DROP INDEX {name} ON user_data"
+
+
+class SQLiteCursor:
+    """
+    A sqlite3 cursor that accepts the mysql.connector-style calls used here.
+
+    When parameters are passed, %s placeholders are rewritten to
+    SQLiteBackend.placeholder (?) and %% to %, as mysql.connector
+    interpolates them; SQL run without parameters is left alone, so a
+    literal such as '%size%' keeps its meaning. Rows are returned as
+    dictionaries when the cursor was opened with dictionary=True.
+    """
+    _PLACEHOLDER = re.compile(r'%(s|%)')
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    @classmethod
+    def _translate(cls, sql):
+        return cls._PLACEHOLDER.sub(
+            lambda match: SQLiteBackend.placeholder if match.group(1) == 's' else '%', sql)
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(self._translate(sql) if params else sql, params or ())
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(self._translate(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return [self._convert(row) for row in rows]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._convert(row)
+
+
+class SQLiteConnection:
+    """A sqlite3 connection that behaves like a mysql.connector connection."""
+    def __init__(self, connection):
+        self._connection = connection
+        self._open = True
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, dictionary=False, buffered=None, **options):
+        # sqlite3 cursors always step through results lazily, so "buffered"
+        # has nothing to switch off.
+        return SQLiteCursor(self._connection.cursor(), dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        self._open = False
+        self._connection.close()
+
+
+class SQLiteBackend:
+    """Connections and dialect-specific SQL for an SQLite database file."""
+    name = 'sqlite'
+    # What SQLiteCursor rewrites the %s placeholders of the queries to
+    placeholder = '?'
+    pool_options = {}
+    # SQLite has no MD5(); stored rows are fetched and hashed client-side
+    row_hash_expression = None
+    upsert_clause = (" ON CONFLICT(user_id) DO UPDATE SET name = excluded.name, "
+                     "email = excluded.email, age = excluded.age")
+
+    @property
+    def path(self):
+        return os.getenv('SQLITE_PATH', os.getenv('DB_NAME', 'ALX_prodev') + '.db')
+
+    def connect_server(self):
+        """SQLite has no server; the database file is the whole database."""
+        return self.connect()
+
+    def connect(self, **options):
+        """Opens the database file; options go to sqlite3.connect()."""
+        try:
+            # Pooled connections are handed from thread to thread (never
+            # shared concurrently), so the same-thread check is disabled.
+            options.setdefault('check_same_thread', False)
+            return SQLiteConnection(sqlite3.connect(self.path, **options))
+        except sqlite3.Error as err:
+            print(f"Error opening {self.path}: {err}")
+            return None
+
+    def bucket_expression(self, column):
+        """SQL for the lower bound of a histogram bucket; takes the width twice."""
+        # Dividing integers is integer division in SQLite
+        return f"({column} / %s) * %s"
+
+    def index_names(self, cursor):
+        """Returns the names of the indexes on user_data."""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'user_data'")
+        return {row[0] for row in cursor.fetchall()}
+
+    def drop_index_sql(self, name):
+        return f"DROP INDEX {name}"
+
+
+BACKENDS = {
+    'mysql': MySQLBackend(),
+    'sqlite': SQLiteBackend(),
+}
+
+
+def get_backend(name=None):
+    """
+    Returns a backend by name, or the one selected by DB_BACKEND (default: mysql).
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or os.getenv('DB_BACKEND', 'mysql')
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown database backend: '{name}'") from None
+
 
 def connect_db():
     """Connects to the MySQL database server."""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
-        return connection
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
-        return None
+    return get_backend().connect_server()
 
 def create_database(connection):
     """Creates the database ALX_prodev if it does not exist."""
+    if get_backend().name == 'sqlite':
+        # The SQLite file is created when it is first opened
+        return
     cursor = connection.cursor()
     try:
         cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
         print("Database ALX_prodev created or already exists.")
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Failed to create database: {err}")
     finally:
         cursor.close()
 
-def connect_to_prodev():
-    """Connects to the ALX_prodev database in MYSQL."""
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database='ALX_prodev'
-        )
-        return connection
-    except mysql.connector.Error as err:
-        print(f"Error connecting to ALX_prodev: {err}")
-        return None
+def connect_to_prodev(**options):
+    """
+    Connects to the ALX_prodev database in MYSQL.
+
+    Any keyword arguments are passed through to the driver's connect().
+    The DB_NAME environment variable selects another database, e.g. a
+    scratch copy for benchmarks, and DB_BACKEND selects the backend.
+    """
+    return get_backend().connect(**options)
+
+class PooledConnection:
+    """
+    A thin wrapper around a pooled connection.
+
+    It behaves like the underlying connection, except that close() hands the
+    connection back to its pool instead of closing the socket, so existing
+    code that calls connection.close() works unchanged.
+    """
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        """Returns the connection to the pool. Calling it twice is a no-op."""
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def invalidate(self):
+        """
+        Closes the underlying connection instead of returning it to the pool.
+
+        Used when the connection is left in a state that is not worth
+        recovering, e.g. an abandoned unbuffered result set that would
+        otherwise have to be read to the end before the connection is reused.
+        """
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.discard(connection, abort=True)
+
+    def is_connected(self):
+        """Reports whether the wrapper still holds a live connection."""
+        return self._connection is not None and self._connection.is_connected()
+
+
+class ConnectionPool:
+    """
+    A bounded pool of ALX_prodev connections shared by the generators.
+
+    - At most ``max_size`` connections are open at once; callers block (up
+      to ``timeout`` seconds) when all of them are checked out.
+    - A connection that has been idle for longer than ``health_check_after``
+      seconds is pinged on checkout and replaced if it is dead.
+    - Connections idle for longer than ``max_idle`` seconds are closed.
+    - hits, misses and wait time are counted; see stats().
+    """
+    def __init__(self, factory=None, max_size=5, max_idle=300.0,
+                 health_check_after=1.0, timeout=30.0):
+        self._factory = factory or (lambda: connect_to_prodev(**get_backend().pool_options))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self._idle = deque()  # (connection, last_used) pairs, most recent last
+        self._open = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'evictions': 0,
+            'failed_health_checks': 0,
+        }
+
+    def discard(self, connection, abort=False):
+        """
+        Closes a connection that will not be reused and frees its slot.
+
+        With abort=True the socket is shut down without the usual goodbye,
+        if the driver supports it: mysql.connector's close() first reads any
+        unread result to the end (consume_results), which is exactly what an
+        abandoned unbuffered stream wants to avoid.
+        """
+        try:
+            shutdown = getattr(connection, 'shutdown', None) if abort else None
+            if shutdown is not None:
+                shutdown()
+            else:
+                connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def _evict_idle(self):
+        """Closes connections that have been idle longer than max_idle."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            # The oldest connections sit at the left end of the deque.
+            while self._idle and now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.popleft()[0])
+                self._stats['evictions'] += 1
+        for connection in expired:
+            self.discard(connection)
+
+    def acquire(self, timeout=None):
+        """
+        Checks a connection out of the pool.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection. Defaults
+                to the pool's timeout.
+
+        Returns:
+            PooledConnection: The borrowed connection, or None if no
+            connection could be obtained.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited_since = None
+        self._evict_idle()
+        while True:
+            connection = None
+            create = False
+            with self._lock:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                elif self._open < self.max_size:
+                    self._open += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        if waited_since is not None:
+                            self._stats['wait_time'] += time.monotonic() - waited_since
+                        print("Error: timed out waiting for a pooled connection.")
+                        return None
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                        self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+                    continue
+                if waited_since is not None:
+                    self._stats['wait_time'] += time.monotonic() - waited_since
+
+            if create:
+                connection = self._factory()
+                with self._lock:
+                    self._stats['misses'] += 1
+                    if connection is None:
+                        self._open -= 1
+                        self._lock.notify()
+                        return None
+                return PooledConnection(self, connection)
+
+            # Only ping connections that have been sitting idle for a while;
+            # one that was just released is almost certainly still alive.
+            if time.monotonic() - last_used > self.health_check_after:
+                try:
+                    healthy = connection.is_connected()
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    with self._lock:
+                        self._stats['failed_health_checks'] += 1
+                    self.discard(connection)
+                    continue
+            with self._lock:
+                self._stats['hits'] += 1
+            return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool.
+
+        Any open transaction is rolled back so the next borrower does not
+        inherit a stale snapshot. Broken connections are closed instead.
+        """
+        try:
+            if getattr(connection, 'in_transaction', True):
+                connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    def stats(self):
+        """Returns a snapshot of the pool counters for monitoring."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['open'] = self._open
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = self._open - len(self._idle)
+        return snapshot
+
+    def close_all(self):
+        """Closes every idle connection in the pool."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the shared ALX_prodev connection pool, creating it on first use.
+
+    The pool size can be set with the DB_POOL_SIZE environment variable.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(max_size=int(os.getenv('DB_POOL_SIZE', '5')))
+        return _pool
+
+
+def set_pool(pool):
+    """
+    Replaces the shared pool, e.g. with one using a custom connection factory.
+
+    The idle connections of the previous pool are closed.
+    """
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    if previous is not None:
+        previous.close_all()
+
+
+def connect_pooled():
+    """
+    Borrows a connection to ALX_prodev from the shared pool.
+
+    Call close() on the returned connection to give it back to the pool.
+    """
+    return get_pool().acquire()
+
 
-def create_table(connection):
-    """Creates a table user_data if it does not exist with the required fields."""
+def pool_stats():
+    """Returns the hit/miss/wait-time counters of the shared pool."""
+    return get_pool().stats()
+
+
+# Column order used whenever rows are fetched as tuples.
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# Row formats understood by the user_data generators:
+# - "dict": one dictionary per row (the default, easiest to read)
+# - "tuple": one plain tuple per row, in USER_COLUMNS order
+# - "record": one UserRecord per row (attribute access, no per-row __dict__)
+# - "columnar": one ColumnarBatch per batch (only for batch/page generators)
+ROW_FORMATS = ('dict', 'tuple', 'record', 'columnar')
+
+
+class UserRecord:
+    """A compact user row. __slots__ avoids allocating a dict per row."""
+    __slots__ = USER_COLUMNS
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    def __iter__(self):
+        return iter((self.user_id, self.name, self.email, self.age))
+
+    def __eq__(self, other):
+        return isinstance(other, UserRecord) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return (f"UserRecord(user_id={self.user_id!r}, name={self.name!r}, "
+                f"email={self.email!r}, age={self.age!r})")
+
+
+class ColumnarBatch:
+    """
+    A batch of user rows stored column by column.
+
+    Ages are kept in an array('i'), which stores plain machine integers
+    instead of one Python int object per row. Indexing the batch returns a
+    row as a tuple, so it can still be iterated row by row when needed.
+    """
+    __slots__ = ('columns',)
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a batch from tuples in USER_COLUMNS order."""
+        user_ids, names, emails, ages = [], [], [], array('i')
+        for user_id, name, email, age in rows:
+            user_ids.append(user_id)
+            names.append(name)
+            emails.append(email)
+            ages.append(int(age))
+        return cls({'user_id': user_ids, 'name': names, 'email': emails, 'age': ages})
+
+    def column(self, name):
+        """Returns all the values of one column."""
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['user_id'])
+
+    def __getitem__(self, index):
+        return tuple(self.columns[name][index] for name in USER_COLUMNS)
+
+    def __iter__(self):
+        return zip(*(self.columns[name] for name in USER_COLUMNS))
+
+
+def check_row_format(row_format, allow_columnar=True):
+    """Raises ValueError if row_format is not a supported row format."""
+    if row_format not in ROW_FORMATS or (row_format == 'columnar' and not allow_columnar):
+        raise ValueError(f"Unsupported row format: '{row_format}'")
+
+
+def user_cursor(connection, row_format='dict', **options):
+    """
+    Opens a cursor suited to the requested row format.
+
+    Only the "dict" format needs a dictionary cursor; the other formats are
+    built from the plain tuples the connector returns.
+    """
+    if row_format == 'dict':
+        return connection.cursor(dictionary=True, **options)
+    return connection.cursor(**options)
+
+
+def select_columns(row_format='dict'):
+    """
+    Returns the SELECT column list for a row format.
+
+    Tuple-based formats need the columns in USER_COLUMNS order, so they are
+    named explicitly instead of relying on SELECT *.
+    """
+    if row_format == 'dict':
+        return '*'
+    return ', '.join(USER_COLUMNS)
+
+
+def format_row(row, row_format='dict'):
+    """Converts a single fetched row to the requested row format."""
+    if row_format == 'record':
+        return UserRecord(*row)
+    return row
+
+
+def format_rows(rows, row_format='dict'):
+    """Converts a list of fetched rows to the requested row format."""
+    if row_format == 'columnar':
+        return ColumnarBatch.from_rows(rows)
+    if row_format == 'record':
+        return [UserRecord(*row) for row in rows]
+    return rows
+
+
+def row_value(row, column):
+    """Reads one column from a row in any of the supported row formats."""
+    if isinstance(row, dict):
+        return row[column]
+    if isinstance(row, tuple):
+        return row[USER_COLUMNS.index(column)]
+    return getattr(row, column)
+
+
+def estimate_row_size(row):
+    """Roughly estimates the memory, in bytes, held by one fetched row."""
+    values = row.values() if isinstance(row, dict) else row
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+
+
+class AdaptiveBatchSizer:
+    """
+    Tunes a fetchmany() batch size at runtime.
+
+    After each batch, the size is scaled toward the one that would have taken
+    ``target_latency`` seconds to fetch, changing by at most a factor of two
+    per step so a single slow batch does not swing it wildly. The result is
+    then capped so that one batch stays within ``memory_budget`` bytes.
+
+    Args:
+        initial (int): The first batch size.
+        target_latency (float): The desired time to fetch one batch, in seconds.
+        memory_budget (int): The maximum estimated size of one batch in bytes,
+            or None for no limit.
+        min_size (int): The smallest batch size allowed.
+        max_size (int): The largest batch size allowed.
+    """
+    def __init__(self, initial=50, target_latency=0.05, memory_budget=None,
+                 min_size=10, max_size=100000):
+        self.size = max(min_size, min(initial, max_size))
+        self.target_latency = target_latency
+        self.memory_budget = memory_budget
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def update(self, rows, seconds, row_bytes):
+        """
+        Records how long a batch took and returns the next batch size.
+
+        Args:
+            rows (int): The number of rows the batch held.
+            seconds (float): How long fetching it took.
+            row_bytes (int): The estimated size of one row.
+        """
+        if rows and seconds > 0:
+            # Only a full batch says anything about the per-row cost
+            if rows == self.size:
+                scale = min(2.0, max(0.5, self.target_latency / seconds))
+                self.size = int(self.size * scale)
+        if self.memory_budget and row_bytes:
+            self.size = min(self.size, self.memory_budget // row_bytes)
+        self.size = max(self.min_size, min(self.size, self.max_size))
+        return self.size
+
+
+# Secondary indexes on user_data, by name.
+# - idx_user_data_name serves the ORDER BY name of stream_users and
+#   stream_users_in_batches, so rows come out in index order without a filesort.
+# - idx_user_data_age_user_id serves "WHERE age > ..." filters and keyset
+#   pagination on age; user_id is the primary key, so the index alone covers
+#   queries that only need (age, user_id).
+USER_DATA_INDEXES = {
+    'idx_user_data_name': ('name',),
+    'idx_user_data_age_user_id': ('age', 'user_id'),
+}
+
+# Indexes that earlier versions of create_table added and that duplicate
+# the primary key.
+REDUNDANT_INDEXES = ('user_id',)
+
+
+def create_table(connection, indexes=False):
+    """
+    Creates a table user_data if it does not exist with the required fields.
+
+    Secondary indexes are not created here by default: loading rows into a
+    bare table and building the indexes once afterwards is much faster than
+    maintaining them row by row. insert_data() creates them when it finishes.
+
+    Args:
+        connection: An open connection to ALX_prodev.
+        indexes (bool): If True, also create the secondary indexes right away.
+    """
     cursor = connection.cursor()
     # Note: MySQL doesn't have a native UUID type like PostgreSQL. VARCHAR(36) is standard.
     # DECIMAL for age is unusual; INT is more standard. We will use INT here.
+    # The primary key is already indexed, so no separate INDEX(user_id) is needed.
     create_table_query = """
     CREATE TABLE IF NOT EXISTS user_data (
         user_id VARCHAR(36) PRIMARY KEY,
         name VARCHAR(255) NOT NULL,
         email VARCHAR(255) NOT NULL,
-        age INT NOT NULL,
-        INDEX(user_id)
+        age INT NOT NULL
     )
     """
     try:
         cursor.execute(create_table_query)
         print("Table user_data created or already exists.")
-    except mysql.connector.Error as err:
+    except DB_ERRORS as err:
         print(f"Failed to create table: {err}")
     finally:
         cursor.close()
+    if indexes:
+        create_indexes(connection)
+
+
+def create_indexes(connection):
+    """
+    Brings the secondary indexes of user_data in line with USER_DATA_INDEXES.
 
-def insert_data(connection, data):
-    """Inserts data from a CSV file into the database if the table is empty."""
+    Missing indexes are created and redundant ones dropped; indexes that
+    already exist are left alone, so calling this repeatedly is cheap.
+    """
     cursor = connection.cursor()
     try:
-        # Check if table is empty before inserting to prevent duplicates
-        cursor.execute("SELECT COUNT(*) FROM user_data")
-        if cursor.fetchone()[0] > 0:
-            print("Data already exists in user_data. Skipping insertion.")
-            return
+        backend = get_backend()
+        existing = backend.index_names(cursor)
+        for name in REDUNDANT_INDEXES:
+            if name in existing:
+                cursor.execute(backend.drop_index_sql(name))
+                print(f"Dropped redundant index {name}.")
+        for name, columns in USER_DATA_INDEXES.items():
+            if name not in existing:
+                cursor.execute(f"CREATE INDEX {name} ON user_data ({', '.join(columns)})")
+                print(f"Created index {name} on ({', '.join(columns)}).")
+    except DB_ERRORS as err:
+        print(f"Failed to create indexes: {err}")
+    finally:
+        cursor.close()
+
+def read_csv_rows(data, skip=0):
+    """
+    A generator that lazily reads user rows from a CSV file.
+
+    Args:
+        data (str): Path to the CSV file (with a header row).
+        skip (int): Number of data rows to skip, e.g. when resuming a load.
 
-        with open(data, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader)  # Skip the header row
-            sql = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
-            
+    Yields:
+        tuple: ``(user_id, name, email, age)`` with age converted to int.
+    """
+    with open(data, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # Skip the header row
+        for row in islice(reader, skip, None):
             # The csv reader gives strings, so we convert age to int
-            data_to_insert = [(row[0], row[1], row[2], int(row[3])) for row in reader]
-            
-            cursor.executemany(sql, data_to_insert)
-            connection.commit()
-            print(f"{cursor.rowcount} records inserted successfully.")
-    except mysql.connector.Error as err:
+            yield (row[0], row[1], row[2], int(row[3]))
+
+
+def _read_checkpoint(path):
+    """Returns the number of rows a previous load committed, or None."""
+    try:
+        with open(path, 'r', encoding='utf-8') as checkpoint_file:
+            return int(checkpoint_file.read().strip() or 0)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path, rows_done):
+    """Atomically records how many rows have been committed so far."""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+        checkpoint_file.write(str(rows_done))
+    os.replace(temporary, path)
+
+
+def row_hash(row):
+    """
+    Returns the content hash of a ``(user_id, name, email, age)`` row.
+
+    It matches MD5(CONCAT_WS('|', name, email, age)) computed by MySQL, so a
+    file row can be compared with the stored row without fetching it.
+    """
+    content = '|'.join((row[1], row[2], str(row[3])))
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def _changed_rows(cursor, chunk):
+    """
+    Drops the rows of a chunk that are already stored with the same content.
+
+    The hashes of the stored rows are computed for just the user_ids in the
+    chunk, so no extra column or table is needed and the hashes can never go
+    stale. MySQL computes them server-side; backends without MD5() return
+    the stored columns and they are hashed here.
+    """
+    placeholders = ', '.join(['%s'] * len(chunk))
+    expression = get_backend().row_hash_expression
+    cursor.execute(
+        f"SELECT user_id, {expression or 'name, email, age'} FROM user_data "
+        f"WHERE user_id IN ({placeholders})",
+        tuple(row[0] for row in chunk)
+    )
+    if expression:
+        stored = dict(cursor.fetchall())
+    else:
+        stored = {row[0]: row_hash(row) for row in cursor.fetchall()}
+    return [row for row in chunk if stored.get(row[0]) != row_hash(row)]
+
+
+def _load_data_infile(connection, cursor, data):
+    """
+    Bulk-loads the CSV with LOAD DATA LOCAL INFILE.
+
+    The connection must have been opened with allow_local_infile=True.
+    Returns the number of rows loaded.
+    """
+    cursor.execute(
+        "LOAD DATA LOCAL INFILE %s INTO TABLE user_data "
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+        "LINES TERMINATED BY '\\n' IGNORE 1 LINES (user_id, name, email, age)",
+        (os.path.abspath(data),)
+    )
+    connection.commit()
+    return cursor.rowcount
+
+
+def insert_data(connection, data, chunk_size=1000, checkpoint=None, method='insert',
+                mode='skip'):
+    """
+    Inserts data from a CSV file into the database if the table is empty.
+
+    With ``mode="upsert"`` the file is merged into a non-empty table instead:
+    new rows are inserted, changed rows are updated and rows whose content
+    hash matches the stored row are skipped, so a daily incremental load only
+    writes the delta. Running the same upsert twice is harmless.
+
+    The file is streamed and inserted in chunks of ``chunk_size`` rows, each
+    committed on its own, so memory stays bounded and a failure only loses
+    the current chunk. After every commit the number of rows loaded so far is
+    written to a checkpoint file; if a load is interrupted, calling
+    insert_data again resumes after the last committed chunk.
+
+    Args:
+        connection: An open connection to ALX_prodev.
+        data (str): Path to the CSV file.
+        chunk_size (int): The number of rows inserted and committed at a time.
+        checkpoint (str): Path of the checkpoint file (default: data + '.checkpoint').
+        method (str): "insert" for chunked multi-row INSERTs, or "load_data"
+            to try LOAD DATA LOCAL INFILE first (falls back to "insert" if
+            the server or connection does not allow it). Only used in
+            "skip" mode on MySQL.
+        mode (str): "skip" to load only into an empty table, or "upsert" to
+            merge the file into existing data.
+
+    Returns:
+        int: The number of rows inserted or updated by this call.
+    """
+    if mode not in ('skip', 'upsert'):
+        raise ValueError(f"Unknown insert mode: '{mode}'")
+    checkpoint = checkpoint or data + '.checkpoint'
+    cursor = connection.cursor()
+    inserted = 0
+    unchanged = 0
+    start = time.monotonic()
+    try:
+        rows_done = _read_checkpoint(checkpoint)
+        resumed = rows_done is not None
+        if rows_done is None and mode == 'upsert':
+            rows_done = 0
+        elif rows_done is None:
+            # Check if table is empty before inserting to prevent duplicates
+            cursor.execute("SELECT COUNT(*) FROM user_data")
+            if cursor.fetchone()[0] > 0:
+                print("Data already exists in user_data. Skipping insertion.")
+                create_indexes(connection)
+                return 0
+            rows_done = 0
+        else:
+            # A leftover checkpoint means the table is expected to be partly
+            # loaded, so the empty-table check does not apply
+            print(f"Resuming load of {data} after {rows_done} committed rows "
+                  f"(from {checkpoint}; delete it to start over). The empty-table "
+                  f"check is skipped.")
+
+        if method == 'load_data' and mode == 'skip' and rows_done == 0 \
+                and get_backend().name == 'mysql':
+            try:
+                inserted = _load_data_infile(connection, cursor, data)
+                elapsed = time.monotonic() - start
+                print(f"{inserted} records loaded in {elapsed:.2f}s "
+                      f"({inserted / elapsed if elapsed else 0:.0f} rows/sec).")
+                create_indexes(connection)
+                return inserted
+            except DB_ERRORS as err:
+                print(f"LOAD DATA LOCAL INFILE unavailable ({err}); using chunked inserts.")
+                connection.rollback()
+
+        # mysql.connector rewrites executemany() of a plain INSERT ... VALUES
+        # into a single multi-row INSERT, so each chunk is one round trip.
+        insert_sql = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
+        upsert_sql = insert_sql + get_backend().upsert_clause
+        # A chunk's commit and its checkpoint write are not atomic: if the
+        # process died between the two, the first chunk after a resume is
+        # already in the table. Upserting that chunk makes resending it
+        # harmless instead of failing on the primary key.
+        replay = resumed
+        rows = read_csv_rows(data, skip=rows_done)
+        # Reading the first chunk opens the file, so a missing file fails
+        # here, before a checkpoint exists that a later run would resume from
+        chunk = list(islice(rows, chunk_size))
+        if not resumed:
+            # Record the start of the load before the first commit, so a
+            # crash right after it still resumes instead of finding a
+            # non-empty table and skipping the rest of the file
+            _write_checkpoint(checkpoint, rows_done)
+        while chunk:
+            rows_done += len(chunk)
+            if mode == 'upsert':
+                changed = _changed_rows(cursor, chunk)
+                unchanged += len(chunk) - len(changed)
+                chunk = changed
+            if chunk:
+                cursor.executemany(upsert_sql if mode == 'upsert' or replay else insert_sql, chunk)
+                replay = False
+                connection.commit()
+                inserted += len(chunk)
+            _write_checkpoint(checkpoint, rows_done)
+            chunk = list(islice(rows, chunk_size))
+
+        # The load is complete, so there is nothing left to resume
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.monotonic() - start
+        if mode == 'upsert':
+            print(f"{inserted} records inserted or updated, {unchanged} unchanged, "
+                  f"in {elapsed:.2f}s ({(inserted + unchanged) / elapsed if elapsed else 0:.0f} rows/sec).")
+        else:
+            print(f"{inserted} records inserted successfully in {elapsed:.2f}s "
+                  f"({inserted / elapsed if elapsed else 0:.0f} rows/sec).")
+        # Build the secondary indexes once, now that the rows are in
+        create_indexes(connection)
+    except DB_ERRORS as err:
         print(f"Error inserting data: {err}")
         connection.rollback()
+        if inserted:
+            print(f"{inserted} rows were committed; run again to resume from the checkpoint.")
     except FileNotFoundError:
         print(f"Error: The file {data} was not found.")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
     finally:
-        cursor.close()
\ No newline at end of file
+        cursor.close()
+    return inserted
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+"""
+This module computes statistics over a stream of numbers in a single pass.
+
+StreamingStats keeps a count, mean and variance (Welford's algorithm), the
+minimum and maximum, and a fixed-width histogram from which percentiles are
+read. Its memory use depends only on the number of histogram buckets, never
+on the number of values, and two instances can be merged, so partial results
+from different partitions or workers combine into the exact same answer.
+
+Statistics can also be saved to and restored from a JSON checkpoint:
+resumable_age_statistics() sweeps user_data with keyset pagination and
+checkpoints after every page, so an interrupted run picks up where it
+stopped instead of starting over. partitioned_scan.AgeStatisticsReducer
+computes the same statistics in parallel.
+
+Example:
+    stats = StreamingStats()
+    stats.update_many(stream_user_ages())
+    print(stats.mean, stats.stddev, stats.percentile(95))
+"""
+import json
+import math
+import os
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class StreamingStats:
+    """
+    Mergeable one-pass statistics: count, mean, variance, min, max and a
+    fixed-width histogram.
+
+    Args:
+        bucket_width (int): Width of each histogram bucket. With the default
+            of 1, percentiles over integers such as ages are exact; wider
+            buckets trade precision for fewer buckets.
+    """
+    def __init__(self, bucket_width=1):
+        self.bucket_width = bucket_width
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # Sum of squared differences from the mean
+        self.min = None
+        self.max = None
+        self.histogram = {}  # bucket lower bound -> count
+
+    def update(self, value):
+        """Adds one value."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = (value // self.bucket_width) * self.bucket_width
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def update_many(self, values):
+        """Adds every value of an iterable, e.g. the stream_user_ages generator."""
+        for value in values:
+            self.update(value)
+        return self
+
+    def merge(self, other):
+        """
+        Folds another StreamingStats into this one.
+
+        The result is the same as if all of other's values had been passed
+        to update() (Chan et al.'s parallel variance formula).
+        """
+        if other.bucket_width != self.bucket_width:
+            raise ValueError("Cannot merge statistics with different bucket widths")
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        for bucket, count in other.histogram.items():
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + count
+        return self
+
+    @property
+    def variance(self):
+        """The population variance, or 0.0 with fewer than two values."""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        """The population standard deviation."""
+        return math.sqrt(self.variance)
+
+    def percentile(self, p):
+        """
+        Returns the p-th percentile (nearest rank), read from the histogram.
+
+        The value returned is the lower bound of the bucket that holds the
+        percentile, so it is exact when bucket_width is 1 and the values are
+        integers, and within one bucket width otherwise.
+
+        Args:
+            p (float): The percentile, between 0 and 100.
+
+        Returns:
+            The percentile, or None if no values have been seen.
+        """
+        if not 0 <= p <= 100:
+            raise ValueError("Percentile must be between 0 and 100")
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return bucket
+        return self.max
+
+    def summary(self):
+        """Returns the main statistics as a dictionary."""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'stddev': self.stddev,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+    def to_dict(self):
+        """Returns the full state as JSON-serialisable data."""
+        return {
+            'bucket_width': self.bucket_width,
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self._m2,
+            'min': self.min,
+            'max': self.max,
+            # JSON object keys are strings, so store the buckets as pairs
+            'histogram': sorted(self.histogram.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuilds an instance from the output of to_dict()."""
+        stats = cls(state['bucket_width'])
+        stats.count = state['count']
+        stats.mean = state['mean']
+        stats._m2 = state['m2']
+        stats.min = state['min']
+        stats.max = state['max']
+        stats.histogram = {bucket: count for bucket, count in state['histogram']}
+        return stats
+
+
+def save_checkpoint(path, stats, cursor=None):
+    """Atomically writes the statistics and the sweep position to ``path``."""
+    temporary = path + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+        json.dump({'stats': stats.to_dict(), 'cursor': cursor}, checkpoint_file)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    """
+    Reads a checkpoint written by save_checkpoint.
+
+    Returns:
+        tuple: ``(stats, cursor)``, or ``(None, None)`` if there is no checkpoint.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as checkpoint_file:
+            state = json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None, None
+    return StreamingStats.from_dict(state['stats']), state['cursor']
+
+
+def resumable_age_statistics(checkpoint, page_size=10000, bucket_width=1):
+    """
+    Computes age statistics over user_data, checkpointing after every page.
+
+    The table is swept in user_id order with keyset pagination, one columnar
+    page at a time. After each page the statistics and the pagination cursor
+    are saved to ``checkpoint``; if the checkpoint exists when this is called,
+    the sweep resumes from it. The checkpoint is kept after the sweep ends,
+    so calling this again simply returns the finished statistics; delete it
+    to start a fresh sweep.
+
+    Args:
+        checkpoint (str): Path of the checkpoint file.
+        page_size (int): The number of rows read per page.
+        bucket_width (int): The histogram bucket width for a new sweep.
+
+    Returns:
+        StreamingStats: The statistics over all ages.
+
+    Raises:
+        Whatever error the database raised. The checkpoint then holds the
+        pages read so far, and calling this again resumes from it.
+    """
+    stats, cursor = load_checkpoint(checkpoint)
+    if stats is None:
+        stats = StreamingStats(bucket_width)
+    else:
+        print(f"Resuming age statistics after {stats.count} rows.")
+
+    # A swallowed error would end the sweep early and look like a finished one
+    for page in lazy_paginate.lazy_pagination(page_size, mode='keyset', cursor=cursor,
+                                              row_format='columnar', raise_errors=True):
+        stats.update_many(page.column('age'))
+        save_checkpoint(checkpoint, stats, lazy_paginate.page_cursor(page))
+    return stats
+
+
+if __name__ == "__main__":
+    stream_ages = __import__('4-stream_ages')
+    stats = StreamingStats().update_many(stream_ages.stream_user_ages())
+    for name, value in stats.summary().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+This module tests that streaming stream_users keeps client memory bounded.
+
+SQLite cursors always step through results lazily, so the difference
+between the buffered and streaming modes only shows with mysql.connector.
+The memory tests therefore run against a mock MySQL connection whose
+buffered cursors read the whole result set at execute(), as the real ones
+do, and whose unbuffered cursors produce rows only as they are fetched.
+Peak memory is measured with tracemalloc, as in benchmark.py. A SQLite
+table (no server needed) checks that both modes return the same rows.
+"""
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import Mock, patch
+
+import seed
+
+benchmark = __import__('benchmark')
+stream_users = __import__('0-stream_users')
+
+
+class FakeMySQLCursor:
+    """A mysql.connector-like cursor over a synthetic user_data table."""
+
+    def __init__(self, rows: int, dictionary: bool, buffered: bool) -> None:
+        self._total = rows
+        self._dictionary = dictionary
+        self._buffered = buffered
+        self._rows = None
+        self.fetch_sizes = []
+
+    def _generate(self):
+        for index in range(self._total):
+            row = (f"user-{index:08d}", f"User {index}", f"user{index}@example.com",
+                   18 + index % 80)
+            yield dict(zip(seed.USER_COLUMNS, row)) if self._dictionary else row
+
+    def execute(self, sql, params=()):
+        rows = self._generate()
+        # A buffered cursor reads the whole result set into client memory
+        self._rows = iter(list(rows)) if self._buffered else rows
+
+    def fetchmany(self, size=1):
+        self.fetch_sizes.append(size)
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        self._rows = None
+
+
+class FakeMySQLConnection:
+    """A mysql.connector-like connection that records its cursors."""
+
+    def __init__(self, rows: int) -> None:
+        self.rows = rows
+        self.cursors = []
+        self.shutdown = Mock()
+        self.close = Mock()
+
+    def cursor(self, dictionary=False, buffered=None):
+        cursor = FakeMySQLCursor(self.rows, dictionary, buffered is not False)
+        self.cursors.append((buffered, cursor))
+        return cursor
+
+    def is_connected(self):
+        return True
+
+    def rollback(self):
+        pass
+
+
+class TestStreamUsersMemory(unittest.TestCase):
+    """Peak memory of stream_users in buffered and streaming mode."""
+
+    SMALL = 2000
+    LARGE = 20000
+
+    def tearDown(self) -> None:
+        """Drops the pool of fake connections."""
+        seed.set_pool(None)
+
+    def use_table(self, rows: int) -> FakeMySQLConnection:
+        """Makes the shared pool hand out a fake connection to rows users."""
+        connection = FakeMySQLConnection(rows)
+        seed.set_pool(seed.ConnectionPool(factory=lambda: connection))
+        return connection
+
+    def peak_memory(self, rows: int, streaming: bool) -> int:
+        """Returns the peak bytes allocated while reading a table of rows."""
+        self.use_table(rows)
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in stream_users.stream_users(streaming=streaming))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, rows)
+        return peak
+
+    def test_streaming_reads_unbuffered_in_prefetch_batches(self) -> None:
+        """Test that streaming asks for an unbuffered cursor and fetchmany."""
+        connection = self.use_table(250)
+        rows = list(stream_users.stream_users(streaming=True, prefetch=100))
+        self.assertEqual(len(rows), 250)
+        [(buffered, cursor)] = connection.cursors
+        self.assertIs(buffered, False)
+        self.assertEqual(cursor.fetch_sizes, [100, 100, 100, 100])
+
+    def test_streaming_peak_is_flat(self) -> None:
+        """Test that ten times the rows does not raise the streaming peak much."""
+        small = self.peak_memory(self.SMALL, streaming=True)
+        large = self.peak_memory(self.LARGE, streaming=True)
+        self.assertLess(large, small * 1.5 + 64 * 1024)
+
+    def test_buffered_peak_grows(self) -> None:
+        """Test that the buffered mode, unlike streaming, holds every row."""
+        streaming = self.peak_memory(self.LARGE, streaming=True)
+        buffered = self.peak_memory(self.LARGE, streaming=False)
+        self.assertGreater(buffered, streaming * 10)
+
+    def test_early_close_shuts_the_connection_down(self) -> None:
+        """Test that an abandoned stream is shut down, not drained by close()."""
+        connection = self.use_table(1000)
+        users = stream_users.stream_users(streaming=True)
+        next(users)
+        users.close()
+        connection.shutdown.assert_called_once_with()
+        connection.close.assert_not_called()
+        self.assertEqual(seed.pool_stats()['in_use'], 0)
+
+
+class TestStreamUsersSQLite(unittest.TestCase):
+    """stream_users against a scratch SQLite database."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Seeds a small user_data table in a temporary directory."""
+        cls.directory = tempfile.mkdtemp()
+        cls.environment = patch.dict(os.environ, {
+            'DB_BACKEND': 'sqlite',
+            'SQLITE_PATH': os.path.join(cls.directory, 'users.db'),
+        })
+        cls.environment.start()
+        seed.set_pool(None)
+        benchmark.seed_table(500)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Closes the pooled connections and removes the database."""
+        seed.set_pool(None)
+        cls.environment.stop()
+        shutil.rmtree(cls.directory)
+
+    def test_modes_return_the_same_rows(self) -> None:
+        """Test that streaming yields the rows of the default mode, in order."""
+        expected = list(stream_users.stream_users())
+        self.assertEqual(len(expected), 500)
+        self.assertEqual(list(stream_users.stream_users(streaming=True, prefetch=64)),
+                         expected)
+
+
+if __name__ == '__main__':
+    unittest.main()